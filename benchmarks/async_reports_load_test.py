@@ -0,0 +1,90 @@
+"""
+Load test: sync vs async report API latency while Bedrock is slow.
+
+Runs the report generator in-process against local stand-ins and fires
+concurrent POSTs in both modes. With async mode the API only records
+the job and enqueues it, so its p99 should stay flat as Bedrock slows.
+
+    python benchmarks/async_reports_load_test.py --requests 40 --concurrency 8
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from local_aws import load_report_generator
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def fire(handler, requests, concurrency, async_mode):
+    """POST `requests` reports concurrently; returns (latencies, responses)"""
+    def call(i):
+        event = {'body': json.dumps({
+            'image_id': f'Cr_{i}.bmp',
+            'failure_mode': 'Crazing',
+            'confidence': '0.97',
+            'async': async_mode
+        })}
+        start = time.perf_counter()
+        response = handler.lambda_handler(event, None)
+        return time.perf_counter() - start, response
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    return [r[0] for r in results], [r[1] for r in results]
+
+
+def run(bedrock_latency, requests, concurrency, workers):
+    handler = load_report_generator(bedrock_latency)
+    from job_queue import drain_queue
+
+    row = {'bedrock_latency_s': bedrock_latency}
+
+    for mode, async_mode in (('sync', False), ('async', True)):
+        latencies, responses = fire(handler, requests, concurrency, async_mode)
+        assert all(r['statusCode'] in (200, 202) for r in responses), responses
+        row[mode] = {
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2)
+        }
+
+    # Drain the async jobs and confirm every one is pollable as COMPLETE
+    start = time.perf_counter()
+    succeeded, failed = drain_queue(
+        handler.get_queue(),
+        handler.process_job,
+        max_workers=workers
+    )
+    row['drain_s'] = round(time.perf_counter() - start, 3)
+    job_ids = [json.loads(r['body'])['job_id'] for r in responses]
+    statuses = [
+        json.loads(handler.get_job_status(job_id)['body'])['status']
+        for job_id in job_ids
+    ]
+    row['jobs_complete'] = statuses.count('COMPLETE')
+    row['jobs_failed'] = failed
+    # Every accepted job must come out COMPLETE; anything else is a lost job
+    assert row['jobs_complete'] == requests, row
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latencies', type=float, nargs='+', default=[0.1, 0.5, 1.0],
+                        help='Fake Bedrock latencies (seconds) to sweep')
+    args = parser.parse_args()
+
+    for latency in args.latencies:
+        print(json.dumps(run(latency, args.requests, args.concurrency, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+In-process stand-ins for the AWS services the Lambda handlers use.
+Only the calls the handlers actually make are implemented.
+"""
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from boto3.dynamodb.conditions import ConditionBase
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Handlers import the shared metrics module from the Lambda layer
+METRICS_LAYER_DIR = os.path.join(REPO_ROOT, 'lambda', 'metrics_layer', 'python')
+if METRICS_LAYER_DIR not in sys.path:
+    sys.path.insert(0, METRICS_LAYER_DIR)
+
+
+class FakeTable:
+    """Dict-backed DynamoDB table keyed on (partition key, sort key)"""
+
+    def __init__(self, name, hash_key, range_key=None, latency=0.0):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.latency = latency  # simulated round trip per write, seconds
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def _key(self, item):
+        return (item[self.hash_key], item.get(self.range_key) if self.range_key else None)
+
+    def put_item(self, Item, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.items[self._key(Item)] = dict(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        with self._lock:
+            item = self.items.get(self._key(Key))
+        return {'Item': dict(item)} if item else {}
+
+    def scan(self, FilterExpression=None, ExpressionAttributeValues=None, Limit=None, **kwargs):
+        with self._lock:
+            items = list(self.items.values())
+        if Limit is not None:
+            items = items[:Limit]  # DynamoDB applies Limit before the filter
+        if FilterExpression:
+            items = [i for i in items if _matches(i, FilterExpression, ExpressionAttributeValues or {})]
+        return {'Items': items}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ExpressionAttributeNames=None, **kwargs):
+        """Supports 'ADD a :x, #b :y' (atomic counters) and 'SET a = :x, #b = :y'"""
+        time.sleep(self.latency)
+        action, _, clauses = UpdateExpression.partition(' ')
+        if action not in ('ADD', 'SET'):
+            raise NotImplementedError(f"Unsupported update: {UpdateExpression}")
+        names = ExpressionAttributeNames or {}
+        with self._lock:
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            for clause in clauses.split(','):
+                attribute, placeholder = clause.replace('=', ' ').split()
+                attribute = names.get(attribute, attribute)
+                value = ExpressionAttributeValues[placeholder]
+                item[attribute] = item.get(attribute, 0) + value if action == 'ADD' else value
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _FakeBatchWriter(self)
+
+    def query(self, KeyConditionExpression, ScanIndexForward=True, Limit=None, IndexName=None, **kwargs):
+        """IndexName is accepted but unused: every item is 'projected' into every index"""
+        conditions = _key_conditions(KeyConditionExpression)
+        with self._lock:
+            items = [dict(i) for i in self.items.values()
+                     if all(_compare(i.get(name), op, value) for name, op, value in conditions)]
+        if self.range_key:
+            items.sort(key=lambda i: i.get(self.range_key), reverse=not ScanIndexForward)
+        return {'Items': items[:Limit] if Limit else items}
+
+
+class _FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+
+_KEY_OPERATORS = {
+    '=': lambda a, b: a == b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def _key_conditions(condition):
+    """Unpack Key('x').eq(v) & Key('y').gte(w) into [('x', '=', v), ('y', '>=', w)]"""
+    if not isinstance(condition, ConditionBase):
+        raise NotImplementedError(f"Unsupported key condition: {condition!r}")
+    expression = condition.get_expression()
+    if expression['operator'] == 'AND':
+        return [c for part in expression['values'] for c in _key_conditions(part)]
+    if expression['operator'] not in _KEY_OPERATORS:
+        raise NotImplementedError(f"Unsupported key operator: {expression['operator']}")
+    key, value = expression['values']
+    return [(key.name, expression['operator'], value)]
+
+
+def _compare(actual, operator, value):
+    return actual is not None and _KEY_OPERATORS[operator](actual, value)
+
+
+def _matches(item, expression, values):
+    """Evaluate 'a = :x AND b = :y' style filter expressions"""
+    for clause in expression.split(' AND '):
+        attribute, placeholder = [part.strip() for part in clause.split('=')]
+        if item.get(attribute) != values[placeholder]:
+            return False
+    return True
+
+
+class FakeDynamoResource:
+    """Stand-in for boto3.resource('dynamodb')"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def create_table(self, name, hash_key, range_key=None, latency=0.0):
+        self.tables[name] = FakeTable(name, hash_key, range_key, latency)
+        return self.tables[name]
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            found = [table.get_item(Key=key).get('Item') for key in request['Keys']]
+            responses[name] = [item for item in found if item]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+class _S3Exceptions:
+    class NoSuchKey(KeyError):
+        pass
+
+
+class FakeS3:
+    """Stand-in for boto3.client('s3') storing objects in memory"""
+
+    exceptions = _S3Exceptions
+
+    def __init__(self, latency=0.0):
+        self.objects = {}
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        time.sleep(self.latency)
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        with self._lock:
+            self.objects[(Bucket, Key)] = Body
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with self._lock:
+            if (Bucket, Key) not in self.objects:
+                raise self.exceptions.NoSuchKey(Key)
+            body = self.objects[(Bucket, Key)]
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        with self._lock:
+            keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {
+            'Contents': [{'Key': k, 'Size': len(self.objects[(Bucket, k)])} for k in page],
+            'KeyCount': len(page),
+            'IsTruncated': start + MaxKeys < len(keys)
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        with self._lock:
+            for obj in Delete['Objects']:
+                self.objects.pop((Bucket, obj['Key']), None)
+        return {'Deleted': Delete['Objects']}
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        with self._lock:
+            body = self.objects[(Bucket, Key)]
+        with open(Filename, 'wb') as f:
+            f.write(body)
+
+
+class FakeBedrock:
+    """
+    Deterministic Bedrock stand-in with configurable latency.
+    Full-report prompts get a schema-complete CAPA report; section
+    prompts get just the requested section.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body, **kwargs):
+        from report_validation import REPORT_SCHEMA
+
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        request = json.loads(body)
+        prompt = request['messages'][0]['content']
+
+        sections = {
+            name: {field: f"Deterministic {field} content" for field in fields}
+            for name, fields in REPORT_SCHEMA.items()
+        }
+        requested = [name for name in REPORT_SCHEMA if f'ONLY the "{name}" section' in prompt]
+        output = sections[requested[0]] if requested else {"failure_mode": "stub", **sections}
+        text = json.dumps(output)
+
+        payload = {
+            'content': [{'type': 'text', 'text': text}],
+            'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}
+        }
+        return {'body': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+
+REPORT_GENERATOR_DIR = os.path.join(REPO_ROOT, 'lambda', 'report_generator')
+REPORTS_TABLE = 'local-reports'
+REPORTS_BUCKET = 'local-reports-bucket'
+
+
+def load_report_generator(bedrock_latency=0.0):
+    """
+    Import lambda/report_generator/handler.py wired to the local stand-ins.
+    Returns the handler module; its clients are the fakes above.
+    """
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ['REPORTS_TABLE'] = REPORTS_TABLE
+    os.environ['REPORTS_BUCKET'] = REPORTS_BUCKET
+    os.environ.pop('JOB_QUEUE_URL', None)
+    if REPORT_GENERATOR_DIR not in sys.path:
+        sys.path.insert(0, REPORT_GENERATOR_DIR)
+
+    import handler
+
+    handler.dynamodb = FakeDynamoResource()
+    handler.dynamodb.create_table(REPORTS_TABLE, 'report_id', 'created_at')
+    handler.s3 = FakeS3()
+    handler.bedrock = FakeBedrock(latency=bedrock_latency)
+    handler.job_queue = None
+    seed_reports(handler.dynamodb, handler.s3)
+    return handler
+
+
+def _seed_variant(report, line):
+    """A seed as it might recur on another line: same mode, different findings"""
+    variant = json.loads(json.dumps(report, default=str))
+    if line:
+        variant['line_id'] = f"L{line + 1}"
+        for section in ('five_whys', 'fishbone', '8d_report'):
+            variant[section] = {key: f"Line {line + 1}: {value}" for key, value in variant[section].items()}
+    return variant
+
+
+def seed_reports(dynamodb, s3, copies=3):
+    """
+    Import the synthetic seed reports via the bulk importer: `copies`
+    distinct reports per failure mode (one per line, a day apart), so
+    retrieval and context packing see several different references.
+    """
+    seed_dir = os.path.join(REPO_ROOT, 'seed_data')
+    if seed_dir not in sys.path:
+        sys.path.insert(0, seed_dir)
+    from bulk_import import import_records
+    from synthetic_reports import SEED_REPORTS
+
+    records = [
+        {
+            'report_id': f"SEED_{failure_mode}_{line}",
+            'created_at': f"2024-01-{line + 1:02d}T00:00:00",
+            'image_id': f"synthetic_{failure_mode.lower()}",
+            **_seed_variant(report, line)
+        }
+        for failure_mode, report in SEED_REPORTS.items()
+        for line in range(copies)
+    ]
+    return import_records(records, dynamodb, s3, REPORTS_TABLE, REPORTS_BUCKET, is_seed=True)
+
+
+MODEL_BUCKET = 'local-model-bucket'
+GOLDEN_BUCKET = 'local-golden-dataset'
+MODELS_DIR = os.path.join(REPO_ROOT, 'models')
+
+
+def seed_model_bucket(s3, bucket=MODEL_BUCKET):
+    """
+    Put model.pth + model_metadata.json where the inference handler looks.
+    Uses models/resnet18_capa.pth when present, otherwise random weights
+    (fine for timing, meaningless for accuracy).
+    """
+    import torch
+    from torchvision.models import resnet18
+
+    with open(os.path.join(MODELS_DIR, 'model_metadata.json'), 'rb') as f:
+        metadata = f.read()
+    s3.put_object(Bucket=bucket, Key='model_metadata.json', Body=metadata)
+
+    weights_path = os.path.join(MODELS_DIR, 'resnet18_capa.pth')
+    if os.path.exists(weights_path):
+        with open(weights_path, 'rb') as f:
+            weights = f.read()
+    else:
+        num_classes = len(json.loads(metadata)['class_names'])
+        buffer = io.BytesIO()
+        torch.save(resnet18(num_classes=num_classes).state_dict(), buffer)
+        weights = buffer.getvalue()
+    s3.put_object(Bucket=bucket, Key='model.pth', Body=weights)
+
+
+def load_inference():
+    """
+    Import lambda/inference/handler.py (as module inference_handler) with
+    its S3 client swapped for a stand-in holding the model artifacts.
+    """
+    import importlib.util
+
+    os.environ['MODEL_BUCKET'] = MODEL_BUCKET
+    inference_dir = os.path.join(REPO_ROOT, 'lambda', 'inference')
+    if inference_dir not in sys.path:
+        sys.path.append(inference_dir)
+    spec = importlib.util.spec_from_file_location(
+        'inference_handler', os.path.join(REPO_ROOT, 'lambda', 'inference', 'handler.py')
+    )
+    inference = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(inference)
+
+    inference.s3 = FakeS3()
+    seed_model_bucket(inference.s3)
+    return inference
+
+
+def load_pipeline(bedrock_latency=0.0):
+    """
+    Import lambda/pipeline/pipeline.py with both handlers wired to the
+    local stand-ins. Returns the pipeline module.
+    """
+    report_generator = load_report_generator(bedrock_latency)
+    os.environ['MODEL_BUCKET'] = MODEL_BUCKET
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'pipeline'))
+
+    import pipeline
+
+    pipeline.report_handler = report_generator
+    model_s3 = FakeS3()
+    seed_model_bucket(model_s3)
+    pipeline.inference_handler.s3 = model_s3
+    return pipeline
+
+
+STATS_TABLE = 'local-prediction-stats'
+DATA_TABLE = 'local-inference-data'
+IMAGES_BUCKET = 'local-images'
+RECORD_QUEUE_URL = 'local-record-queue'
+
+
+class FakeSQS:
+    """Stand-in for boto3.client('sqs'): keeps sent messages for a worker to drain"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.messages.append(MessageBody)
+        return {'MessageId': str(len(self.messages))}
+
+    def drain(self, worker, batch_size=10):
+        """Feed queued messages to an SQS-triggered handler; returns failed count"""
+        failed = 0
+        while self.messages:
+            with self._lock:
+                batch, self.messages = self.messages[:batch_size], self.messages[batch_size:]
+            records = [{'messageId': str(i), 'body': body} for i, body in enumerate(batch)]
+            failed += len(worker({'Records': records}, None)['batchItemFailures'])
+        return failed
+
+
+def enable_hot_path_writes(inference, latency=0.0, queue=False):
+    """
+    Turn on the inference handler's per-prediction writes (stats rollup,
+    prediction record + image) against stand-ins that take `latency`
+    seconds per call. With queue=True they go through a FakeSQS for the
+    recorder worker instead of being written inline.
+    Returns (FakeDynamoResource, FakeSQS or None).
+    """
+    recorder = inference.recorder
+    dynamodb = FakeDynamoResource()
+    recorder.STATS_TABLE = STATS_TABLE
+    recorder.stats_table = dynamodb.create_table(STATS_TABLE, 'stat_key', latency=latency)
+    recorder.DATA_TABLE = DATA_TABLE
+    recorder.data_table = dynamodb.create_table(DATA_TABLE, 'image_id', 'inference_timestamp', latency=latency)
+    recorder.IMAGES_BUCKET = IMAGES_BUCKET
+    recorder.s3 = FakeS3(latency)
+    recorder.sqs = FakeSQS(latency) if queue else None
+    recorder.RECORD_QUEUE_URL = RECORD_QUEUE_URL if queue else None
+    return dynamodb, recorder.sqs
@@ -0,0 +1,85 @@
+"""
+Lookup latency of the near-duplicate hash index at scale.
+
+Fills a HashIndex with N synthetic 64-bit hashes (distinct captures plus
+re-captures a few bits away), then times nearest() for queries that
+should hit (perturbed stored hashes) and queries that should miss.
+
+    python benchmarks/near_duplicate_index.py --entries 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from local_aws import REPO_ROOT
+
+sys.path.append(os.path.join(REPO_ROOT, 'lambda', 'inference'))
+
+from phash import DEFAULT_DISTANCE, HashIndex  # noqa: E402
+
+
+def perturb(value, bits, rng):
+    for position in rng.sample(range(64), bits):
+        value ^= 1 << position
+    return value
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def time_lookups(index, queries):
+    latencies = []
+    hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        hits += index.nearest(query) is not None
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return {
+        'queries': len(queries),
+        'hits': hits,
+        'p50_us': round(percentile(latencies, 0.50), 1),
+        'p99_us': round(percentile(latencies, 0.99), 1),
+        'max_us': round(latencies[-1], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--distance', type=int, default=DEFAULT_DISTANCE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = HashIndex(args.distance)
+    captures = [rng.getrandbits(64) for _ in range(max(1, args.entries // 10))]
+
+    start = time.perf_counter()
+    for i in range(args.entries):
+        if i < len(captures):
+            index.add(i, captures[i])
+        else:
+            # Re-captures sit just outside the duplicate radius so they are stored
+            index.add(i, perturb(rng.choice(captures), args.distance + 2, rng))
+    build_seconds = time.perf_counter() - start
+
+    near = [perturb(rng.choice(captures), args.distance // 2, rng) for _ in range(args.queries)]
+    far = [rng.getrandbits(64) for _ in range(args.queries)]
+
+    print(json.dumps({
+        'entries': len(index),
+        'distance': args.distance,
+        'build_seconds': round(build_seconds, 2),
+        'near_duplicate_queries': time_lookups(index, near),
+        'novel_queries': time_lookups(index, far)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
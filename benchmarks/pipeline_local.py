@@ -0,0 +1,76 @@
+"""
+Local-mode runner for the fused pipeline: both handlers in-process
+against local stand-ins, printing the per-stage trace of every request
+and mean stage timings.
+
+    python benchmarks/pipeline_local.py --requests 10 --bedrock-latency 0.5
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+from collections import defaultdict
+
+from local_aws import REPO_ROOT, load_pipeline
+
+TEST_IMAGES = os.path.join(REPO_ROOT, 'data', 'NEU Metal Surface Defects Data', 'test')
+
+
+def load_images(limit):
+    """Base64 test images, one per class in turn"""
+    paths = sorted(glob.glob(os.path.join(TEST_IMAGES, '*', '*.bmp')))
+    by_class = defaultdict(list)
+    for path in paths:
+        by_class[os.path.basename(os.path.dirname(path))].append(path)
+    ordered = [p for group in zip(*by_class.values()) for p in group]
+
+    images = []
+    for path in ordered[:limit]:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), base64.b64encode(f.read()).decode('ascii')))
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--bedrock-latency', type=float, default=0.0)
+    parser.add_argument('--min-confidence', type=float, default=0.0,
+                        help='Random local weights give low confidence; 0 always generates a report')
+    parser.add_argument('--repeat-first', action='store_true',
+                        help='Send the first image again at the end to show a cache hit')
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.bedrock_latency)
+    images = load_images(args.requests)
+    if args.repeat_first and images:
+        images.append(images[0])
+
+    totals = defaultdict(float)
+    counts = defaultdict(int)
+    for image_id, image_b64 in images:
+        event = {'body': json.dumps({
+            'image_data': image_b64,
+            'image_id': image_id,
+            'min_confidence': args.min_confidence
+        })}
+        response = pipeline.handler(event, None)
+        body = json.loads(response['body'])
+        trace = body.get('trace', {})
+        print(json.dumps({
+            'image_id': image_id,
+            'status': response['statusCode'],
+            'predicted_class': body.get('inference', {}).get('predicted_class'),
+            'report_skipped': body.get('report_skipped'),
+            'trace': trace
+        }))
+        for stage, ms in trace.items():
+            totals[stage] += ms
+            counts[stage] += 1
+
+    print(json.dumps({'mean_stage_ms': {s: round(totals[s] / counts[s], 3) for s in totals}}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+End-to-end benchmark suite for the Lambda handlers, run against local
+stand-ins (no AWS needed).
+
+Each scenario runs in a fresh subprocess so the first request is a true
+cold start and peak memory is per scenario. Payloads (payload.json plus
+one NEU test image per class, or --payloads files) are replayed
+round-robin at the requested concurrency. Latency percentiles cover 2xx
+responses only; anything else is counted under errors. Results go to
+JSON so runs can be diffed with --compare.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scenarios inference --hot-path-writes --write-latency 0.02
+    python benchmarks/run_benchmarks.py --scenarios inference --hot-path-writes --record-queue
+    python benchmarks/run_benchmarks.py --scenarios report --bedrock-latency 1.0 --concurrency 16
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/bench_20261019T120000Z.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+SCENARIOS = ['inference', 'report', 'pipeline']
+DEFAULT_PAYLOADS = [os.path.join(REPO_ROOT, 'payload.json')]
+FAILURE_MODES = ['Crazing', 'Inclusion', 'Patches', 'Pitted_Surface', 'Rolled_In_Scale', 'Scratches']
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_events(paths):
+    """API Gateway-style events from payload files ({"body": ...} or a bare body)"""
+    events = []
+    for path in paths:
+        with open(path, 'r') as f:
+            payload = json.load(f)
+        events.append(payload if 'body' in payload else {'body': json.dumps(payload)})
+    return events
+
+
+def image_events(paths):
+    """Payload files plus one NEU test image per class"""
+    from pipeline_local import load_images
+
+    events = load_events(paths)
+    for filename, image_b64 in load_images(len(FAILURE_MODES)):
+        events.append({'body': json.dumps({'image_id': filename, 'image_data': image_b64})})
+    return events
+
+
+def report_events(count):
+    return [
+        {'body': json.dumps({'image_id': f'bench_{i}.bmp', 'failure_mode': FAILURE_MODES[i % 6],
+                             'confidence': '0.95'})}
+        for i in range(count)
+    ]
+
+
+# ---------- Child: one scenario in a fresh interpreter ----------
+
+def run_scenario(scenario, config):
+    sys.path.insert(0, BENCH_DIR)
+    import local_aws
+
+    if not config['prediction_cache']:
+        os.environ['PREDICTION_CACHE_SIZE'] = '0'
+
+    start = time.perf_counter()
+    if scenario == 'inference':
+        module = local_aws.load_inference()
+        invoke = module.handler
+        events = image_events(config['payloads'])
+        inference = module
+    elif scenario == 'report':
+        module = local_aws.load_report_generator(config['bedrock_latency'])
+        invoke = module.lambda_handler
+        events = report_events(len(FAILURE_MODES))
+    else:
+        module = local_aws.load_pipeline(config['bedrock_latency'])
+        invoke = module.handler
+        events = image_events(config['payloads'])
+        inference = module.inference_handler
+    if scenario != 'report' and config['hot_path_writes']:
+        local_aws.enable_hot_path_writes(inference, config['write_latency'], config['record_queue'])
+    import_ms = (time.perf_counter() - start) * 1000
+
+    def call(i):
+        started = time.perf_counter()
+        response = invoke(events[i % len(events)], None)
+        return (time.perf_counter() - started) * 1000, response['statusCode']
+
+    # Cold: the first invocation pays for model download/load, client setup
+    cold_ms, cold_status = call(0)
+
+    statuses = Counter([cold_status])
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config['concurrency']) as executor:
+        results = list(executor.map(call, range(1, config['requests'] + 1)))
+    wall_s = time.perf_counter() - started
+
+    # Error responses return early and would drag the percentiles down
+    warm = [ms for ms, status in results if 200 <= status < 300]
+    statuses.update(status for _, status in results)
+    return {
+        'scenario': scenario,
+        'requests': config['requests'],
+        'concurrency': config['concurrency'],
+        'import_ms': round(import_ms, 2),
+        'cold_start_ms': round(cold_ms, 2),
+        'warm_mean_ms': round(sum(warm) / len(warm), 2) if warm else None,
+        'p50_ms': round(percentile(warm, 50), 2) if warm else None,
+        'p95_ms': round(percentile(warm, 95), 2) if warm else None,
+        'p99_ms': round(percentile(warm, 99), 2) if warm else None,
+        'throughput_rps': round(len(warm) / wall_s, 2) if wall_s else None,
+        'errors': len(results) - len(warm) + (not 200 <= cold_status < 300),
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'status_codes': {str(k): v for k, v in sorted(statuses.items())}
+    }
+
+
+# ---------- Parent ----------
+
+def spawn(scenario, config):
+    command = [sys.executable, os.path.abspath(__file__), '--child', scenario,
+               '--config', json.dumps(config)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=REPO_ROOT)
+    if completed.returncode != 0:
+        return {'scenario': scenario, 'error': completed.stderr.strip().splitlines()[-1:]}
+    # Handlers log JSON lines too; the result is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=REPO_ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path, 'r') as f:
+        previous = {r['scenario']: r for r in json.load(f)['results']}
+    for result in current:
+        before = previous.get(result['scenario'])
+        if not before or 'error' in result or 'error' in before:
+            continue
+        deltas = {}
+        for metric in ('cold_start_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'peak_rss_mb', 'errors'):
+            if before.get(metric) and result.get(metric) is not None:
+                deltas[metric] = f"{(result[metric] - before[metric]) / before[metric] * 100:+.1f}%"
+        print(f"Δ {result['scenario']:<10} {json.dumps(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--payloads', nargs='+', default=DEFAULT_PAYLOADS,
+                        help='Event/body JSON files replayed round-robin (NEU test images are always added)')
+    parser.add_argument('--requests', type=int, default=50, help='Warm requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--bedrock-latency', type=float, default=0.2,
+                        help='Fake Bedrock latency in seconds')
+    parser.add_argument('--prediction-cache', action='store_true',
+                        help='Keep the inference prediction cache on (off so forward passes are measured)')
+    parser.add_argument('--hot-path-writes', action='store_true',
+                        help='Enable the inference STATS_TABLE/DATA_TABLE writes against stand-ins')
+    parser.add_argument('--write-latency', type=float, default=0.01,
+                        help='Simulated DynamoDB/S3 latency per write in seconds (with --hot-path-writes)')
+    parser.add_argument('--record-queue', action='store_true',
+                        help='Hand the hot-path writes to a stand-in record queue (one send per request)')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/bench_<UTC>.json)')
+    parser.add_argument('--compare', help='Previous results file to diff against')
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, json.loads(args.config))))
+        return
+
+    config = {
+        'payloads': [os.path.abspath(p) for p in args.payloads],
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'bedrock_latency': args.bedrock_latency,
+        'prediction_cache': args.prediction_cache,
+        'hot_path_writes': args.hot_path_writes,
+        'write_latency': args.write_latency,
+        'record_queue': args.record_queue
+    }
+
+    results = []
+    for scenario in args.scenarios:
+        result = spawn(scenario, config)
+        results.append(result)
+        print(json.dumps(result))
+        if result.get('errors'):
+            print(f"⚠️ {result['scenario']}: {result['errors']} non-2xx responses {result['status_codes']}")
+
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{timestamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'timestamp': timestamp,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'config': config,
+            'results': results
+        }, f, indent=2)
+    print(f"📄 Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,9 @@ from aws_cdk import (
     aws_lambda as lambda_,
     aws_ecr_assets as ecr_assets,
     aws_apigateway as apigw,  # ADD
+    aws_iam as iam,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as event_sources,
     CfnOutput,  # ADD
 )
 from constructs import Construct
@@ -12,11 +15,52 @@ class CapaInferenceStack(Stack):
     def __init__(self, scope: Construct, id: str, storage_stack, **kwargs):
         super().__init__(scope, id, **kwargs)
 
+        # Prediction stats/records are queued here instead of written on the
+        # request path (visibility > recorder timeout)
+        self.record_queue = sqs.Queue(
+            self, "PredictionRecordQueue",
+            visibility_timeout=Duration.seconds(120),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=3,
+                queue=sqs.Queue(self, "PredictionRecordDLQ", retention_period=Duration.days(14))
+            )
+        )
+
+        # Drains the record queue: image to S3, record to DynamoDB, rollup update
+        self.recorder_function = lambda_.Function(
+            self, "RecorderFunc",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="recorder.worker_handler",
+            code=lambda_.Code.from_asset(
+                "lambda/inference",
+                exclude=["handler.py", "Dockerfile", "requirements.txt", "*.log", "__pycache__"]
+            ),
+            timeout=Duration.seconds(60),
+            memory_size=256,
+            environment={
+                "DATA_TABLE": storage_stack.data_table.table_name,
+                "IMAGES_BUCKET": storage_stack.images_bucket.bucket_name,
+                "STATS_TABLE": storage_stack.stats_table.table_name,
+            }
+        )
+        self.recorder_function.add_event_source(
+            event_sources.SqsEventSource(
+                self.record_queue,
+                batch_size=25,
+                max_batching_window=Duration.seconds(5),
+                report_batch_item_failures=True
+            )
+        )
+        storage_stack.data_table.grant_write_data(self.recorder_function)
+        storage_stack.stats_table.grant_write_data(self.recorder_function)
+        storage_stack.images_bucket.grant_put(self.recorder_function)
+
         # Existing Lambda function code...
         self.inference_function = lambda_.DockerImageFunction(
             self, "InferenceFunc",
             code=lambda_.DockerImageCode.from_image_asset(
-                directory="lambda/inference",
+                directory="lambda",
+                file="inference/Dockerfile",
                 platform=ecr_assets.Platform.LINUX_AMD64,
                 cmd=["handler.handler"]
             ),
@@ -26,12 +70,18 @@ class CapaInferenceStack(Stack):
             environment={
                 "MODEL_BUCKET": storage_stack.model_bucket.bucket_name,
                 "DATA_TABLE": storage_stack.data_table.table_name,
+                "IMAGES_BUCKET": storage_stack.images_bucket.bucket_name,
+                "STATS_TABLE": storage_stack.stats_table.table_name,
+                "RECORD_QUEUE_URL": self.record_queue.queue_url,
             }
         )
 
-        # Grant permissions...
+        # Grant permissions (table/bucket writes are the fallback when a handoff fails)
+        self.record_queue.grant_send_messages(self.inference_function)
         storage_stack.model_bucket.grant_read(self.inference_function)
         storage_stack.data_table.grant_read_write_data(self.inference_function)
+        storage_stack.images_bucket.grant_put(self.inference_function)
+        storage_stack.stats_table.grant_read_write_data(self.inference_function)
 
         # ✨ ADD API GATEWAY
         api = apigw.RestApi(
@@ -52,6 +102,73 @@ class CapaInferenceStack(Stack):
         
         api.root.add_method("POST", inference_integration)
 
+        # Fused inference + report generation (build context is lambda/)
+        self.pipeline_function = lambda_.DockerImageFunction(
+            self, "PipelineFunc",
+            code=lambda_.DockerImageCode.from_image_asset(
+                directory="lambda",
+                file="pipeline/Dockerfile",
+                platform=ecr_assets.Platform.LINUX_AMD64,
+                cmd=["pipeline.handler"]
+            ),
+            timeout=Duration.minutes(5),
+            memory_size=3008,
+            architecture=lambda_.Architecture.X86_64,
+            environment={
+                "MODEL_BUCKET": storage_stack.model_bucket.bucket_name,
+                "REPORTS_TABLE": storage_stack.reports_table.table_name,
+                "REPORTS_BUCKET": storage_stack.reports_bucket.bucket_name,
+                "MIN_REPORT_CONFIDENCE": "0.5",
+                "STATS_TABLE": storage_stack.stats_table.table_name,
+                "DATA_TABLE": storage_stack.data_table.table_name,
+                "IMAGES_BUCKET": storage_stack.images_bucket.bucket_name,
+                "RECORD_QUEUE_URL": self.record_queue.queue_url,
+            }
+        )
+        self.record_queue.grant_send_messages(self.pipeline_function)
+        storage_stack.stats_table.grant_read_write_data(self.pipeline_function)
+        storage_stack.data_table.grant_read_write_data(self.pipeline_function)
+        storage_stack.images_bucket.grant_put(self.pipeline_function)
+        storage_stack.model_bucket.grant_read(self.pipeline_function)
+        storage_stack.reports_table.grant_read_write_data(self.pipeline_function)
+        storage_stack.reports_bucket.grant_read_write(self.pipeline_function)
+        self.pipeline_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["bedrock:InvokeModel"],
+                resources=[
+                    "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0"
+                ]
+            )
+        )
+
+        # POST /pipeline - image in, prediction + CAPA report out
+        api.root.add_resource("pipeline").add_method(
+            "POST",
+            apigw.LambdaIntegration(self.pipeline_function, proxy=True)
+        )
+
+        # POST /feedback - operator label for a prediction (feeds active learning)
+        self.feedback_function = lambda_.Function(
+            self, "FeedbackFunc",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="handler.handler",
+            code=lambda_.Code.from_asset("lambda/feedback"),
+            timeout=Duration.seconds(10),
+            memory_size=256,
+            environment={
+                "FEEDBACK_TABLE": storage_stack.feedback_table.table_name,
+                "DATA_TABLE": storage_stack.data_table.table_name,
+                "MODEL_BUCKET": storage_stack.model_bucket.bucket_name,
+            }
+        )
+        storage_stack.feedback_table.grant_write_data(self.feedback_function)
+        storage_stack.data_table.grant_write_data(self.feedback_function)
+        storage_stack.model_bucket.grant_read(self.feedback_function)
+        api.root.add_resource("feedback").add_method(
+            "POST",
+            apigw.LambdaIntegration(self.feedback_function, proxy=True)
+        )
+
         # ✨ ADD OUTPUT (matching the script's query)
         CfnOutput(
             self, "InferenceUrl",
@@ -4,37 +4,116 @@ from aws_cdk import (
     aws_lambda as _lambda,
     aws_apigateway as apigw,
     aws_iam as iam,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as event_sources,
+    aws_events as events,
+    aws_events_targets as targets,
 )
 from constructs import Construct
 
+# Report job deliveries before the DLQ; the worker marks FAILED on the last one
+JOB_MAX_RECEIVES = 3
+
 
 class ReportGeneratorStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, storage_stack, **kwargs):
         super().__init__(scope, construct_id, **kwargs)
         
+        # Queue for async report jobs (visibility > worker timeout)
+        self.report_queue = sqs.Queue(
+            self, "ReportJobQueue",
+            visibility_timeout=Duration.seconds(360),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=JOB_MAX_RECEIVES,
+                queue=sqs.Queue(self, "ReportJobDLQ", retention_period=Duration.days(14))
+            )
+        )
+
+        # Shared hot-path metrics module (EMF), also copied into the inference images
+        metrics_layer = _lambda.LayerVersion(
+            self, "MetricsLayer",
+            code=_lambda.Code.from_asset("lambda/metrics_layer"),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_11],
+            description="CloudWatch EMF stage timing for CAPA handlers"
+        )
+
         # Lambda function for report generation
         self.report_lambda = _lambda.Function(
             self, "ReportGeneratorFunction",
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="handler.lambda_handler",
             code=_lambda.Code.from_asset("lambda/report_generator"),
+            layers=[metrics_layer],
             timeout=Duration.seconds(60),
             memory_size=512,
+            environment={
+                "REPORTS_TABLE": storage_stack.reports_table.table_name,
+                "REPORTS_BUCKET": storage_stack.reports_bucket.bucket_name,
+                "JOB_QUEUE_URL": self.report_queue.queue_url,
+            }
+        )
+
+        # Worker that drains the job queue with bounded concurrency
+        self.report_worker = _lambda.Function(
+            self, "ReportWorkerFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="handler.worker_handler",
+            code=_lambda.Code.from_asset("lambda/report_generator"),
+            layers=[metrics_layer],
+            timeout=Duration.seconds(300),
+            memory_size=512,
+            environment={
+                "REPORTS_TABLE": storage_stack.reports_table.table_name,
+                "REPORTS_BUCKET": storage_stack.reports_bucket.bucket_name,
+                "WORKER_CONCURRENCY": "4",
+                "JOB_MAX_RECEIVES": str(JOB_MAX_RECEIVES),
+            }
+        )
+        self.report_worker.add_event_source(
+            event_sources.SqsEventSource(
+                self.report_queue,
+                batch_size=4,
+                max_concurrency=5,
+                report_batch_item_failures=True
+            )
         )
         
+        # Daily job rolling each day's reports into one compressed JSONL file
+        self.compaction_lambda = _lambda.Function(
+            self, "ReportCompactionFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="archive.compaction_handler",
+            code=_lambda.Code.from_asset("lambda/report_generator"),
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            environment={
+                "REPORTS_BUCKET": storage_stack.reports_bucket.bucket_name,
+                "DELETE_COMPACTED": "false",
+            }
+        )
+        storage_stack.reports_bucket.grant_read_write(self.compaction_lambda)
+        storage_stack.reports_bucket.grant_delete(self.compaction_lambda)
+        events.Rule(
+            self, "DailyReportCompaction",
+            schedule=events.Schedule.cron(minute="15", hour="1"),
+            targets=[targets.LambdaFunction(self.compaction_lambda)]
+        )
+
         # Grant permissions
-        storage_stack.reports_table.grant_read_write_data(self.report_lambda)
-        storage_stack.reports_bucket.grant_read_write(self.report_lambda)
+        self.report_queue.grant_send_messages(self.report_lambda)
+        for function in (self.report_lambda, self.report_worker):
+            storage_stack.reports_table.grant_read_write_data(function)
+            storage_stack.reports_bucket.grant_read_write(function)
         
-        # Grant Bedrock access
-        self.report_lambda.add_to_role_policy(
-            iam.PolicyStatement(
-                actions=["bedrock:InvokeModel"],
-                resources=[
-                    "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0"
-                ]
+            # Grant Bedrock access
+            function.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["bedrock:InvokeModel"],
+                    resources=[
+                        "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0"
+                    ]
+                )
             )
-        )
         
         # API Gateway
         api = apigw.RestApi(
@@ -49,5 +128,12 @@ class ReportGeneratorStack(Stack):
             "POST",
             apigw.LambdaIntegration(self.report_lambda)
         )
+
+        # GET /reports/{job_id} - poll async job status
+        job_resource = api.root.add_resource("reports").add_resource("{job_id}")
+        job_resource.add_method(
+            "GET",
+            apigw.LambdaIntegration(self.report_lambda)
+        )
         
         self.api_url = api.url
\ No newline at end of file
@@ -2,6 +2,7 @@ from aws_cdk import (
     Stack,
     RemovalPolicy,
     Duration,
+    CfnOutput,
     aws_s3 as s3,
     aws_dynamodb as dynamodb,
 )
@@ -36,6 +37,14 @@ class StorageStack(Stack):
             removal_policy=RemovalPolicy.DESTROY,
             auto_delete_objects=True,
         )
+        # S3 Bucket for the golden (retraining) dataset, deduplicated on upload
+        self.golden_dataset_bucket = s3.Bucket(
+            self, "GoldenDatasetBucket",
+            versioned=True,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            removal_policy=RemovalPolicy.RETAIN,
+        )
         # S3 Bucket for CAPA reports
         self.reports_bucket = s3.Bucket(
             self, "ReportsBucket",
@@ -44,6 +53,14 @@ class StorageStack(Stack):
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
             removal_policy=RemovalPolicy.DESTROY,
             auto_delete_objects=True,
+            lifecycle_rules=[
+                # Compaction deletes only add delete markers; free the old versions
+                s3.LifecycleRule(
+                    id="ExpireNoncurrentReports",
+                    noncurrent_version_expiration=Duration.days(7),
+                    expired_object_delete_marker=True
+                )
+            ]
         )
         # DynamoDB Table for feedback
         self.feedback_table = dynamodb.Table(
@@ -77,6 +94,19 @@ class StorageStack(Stack):
             point_in_time_recovery=True
         )
 
+        # Seed reports by failure mode (sparse: only seeds set seed_failure_mode)
+        self.reports_table.add_global_secondary_index(
+            index_name="seed-failure-mode-index",
+            partition_key=dynamodb.Attribute(
+                name="seed_failure_mode",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="created_at",
+                type=dynamodb.AttributeType.STRING
+            ),
+        )
+
         # ✨ ADD: DynamoDB Table for inference results/data
         self.data_table = dynamodb.Table(
             self, "InferenceDataTable",
@@ -92,3 +122,37 @@ class StorageStack(Stack):
             removal_policy=RemovalPolicy.DESTROY,
             point_in_time_recovery=True
         )
+
+        # Labelled predictions for active-learning selection (sparse: only the
+        # feedback handler sets feedback_status, so unlabelled records stay out)
+        self.data_table.add_global_secondary_index(
+            index_name="feedback-status-index",
+            partition_key=dynamodb.Attribute(
+                name="feedback_status",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="inference_timestamp",
+                type=dynamodb.AttributeType.STRING
+            ),
+        )
+
+        # DynamoDB Table for hourly prediction rollups (atomic counters)
+        self.stats_table = dynamodb.Table(
+            self, "PredictionStatsTable",
+            partition_key=dynamodb.Attribute(
+                name="stat_key",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+
+        # Outputs used by scripts (e.g. seed_data/bulk_import.py)
+        CfnOutput(self, "ReportsTableName", value=self.reports_table.table_name)
+        CfnOutput(self, "ReportsBucketName", value=self.reports_bucket.bucket_name)
+        CfnOutput(self, "StatsTableName", value=self.stats_table.table_name)
+        CfnOutput(self, "GoldenDatasetBucketName", value=self.golden_dataset_bucket.bucket_name)
+        CfnOutput(self, "InferenceDataTableName", value=self.data_table.table_name)
+        CfnOutput(self, "ImagesBucketName", value=self.images_bucket.bucket_name)
+        CfnOutput(self, "FeedbackTableName", value=self.feedback_table.table_name)
@@ -0,0 +1,93 @@
+"""
+Operator feedback on a prediction (POST /feedback):
+
+{
+    "image_id": "Cr_1.bmp",
+    "inference_timestamp": "2026-10-19T12:00:00.123456+00:00",   (from the inference response)
+    "label": "Crazing",                                           (the correct class)
+    "user": "inspector-7"                                         (optional)
+}
+
+Every submission is appended to the feedback table (image_id, timestamp).
+The label is also copied onto the prediction record in the inference data
+table with feedback_status = "labeled". Only labelled records carry
+feedback_status, so feedback-status-index stays sparse, and it is what
+scripts/active_learning.py selects from.
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+import boto3
+
+FEEDBACK_TABLE = os.environ.get('FEEDBACK_TABLE')
+DATA_TABLE = os.environ.get('DATA_TABLE')
+MODEL_BUCKET = os.environ.get('MODEL_BUCKET')
+LABELLED_STATUS = "labeled"
+
+dynamodb = boto3.resource('dynamodb', endpoint_url=os.environ.get('AWS_ENDPOINT_URL'))
+s3 = boto3.client('s3')
+class_names = None
+
+
+def load_class_names():
+    """Classes of the deployed model (same metadata the inference handler loads)"""
+    global class_names
+    if class_names is None:
+        body = s3.get_object(Bucket=MODEL_BUCKET, Key='model_metadata.json')['Body'].read()
+        class_names = json.loads(body)['class_names']
+    return class_names
+
+
+def response(status, body):
+    return {
+        'statusCode': status,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(body)
+    }
+
+
+def record_feedback(body, now=None):
+    """Append the feedback item and label the prediction record; returns the item"""
+    timestamp = (now or datetime.now(timezone.utc)).isoformat()
+    item = {
+        'image_id': body['image_id'],
+        'timestamp': timestamp,
+        'label': body['label'],
+        'inference_timestamp': body.get('inference_timestamp'),
+        'user': body.get('user')
+    }
+    item = {k: v for k, v in item.items() if v is not None}
+    dynamodb.Table(FEEDBACK_TABLE).put_item(Item=item)
+
+    # Cache-hit predictions have no record of their own; the feedback row is kept anyway
+    if body.get('inference_timestamp'):
+        dynamodb.Table(DATA_TABLE).update_item(
+            Key={'image_id': body['image_id'], 'inference_timestamp': body['inference_timestamp']},
+            UpdateExpression="SET feedback_status = :s, #label = :l, labeled_at = :t",
+            ExpressionAttributeNames={'#label': 'label'},
+            ExpressionAttributeValues={':s': LABELLED_STATUS, ':l': body['label'], ':t': timestamp}
+        )
+    return item
+
+
+def handler(event, context):
+    try:
+        body = json.loads(event['body']) if isinstance(event.get('body'), str) else event.get('body', event)
+        missing = [field for field in ('image_id', 'label') if not body.get(field)]
+        if missing:
+            return response(400, {'error': f"Missing field(s): {', '.join(missing)}"})
+        if body['label'] not in load_class_names():
+            return response(400, {'error': f"Unknown label {body['label']}",
+                                  'labels': load_class_names()})
+
+        item = record_feedback(body)
+        print(json.dumps({'event': 'feedback', 'image_id': item['image_id'], 'label': item['label']}))
+        return response(200, item)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return response(500, {'error': str(e)})
@@ -1,22 +1,57 @@
 import json
 import base64
+import hashlib
 import io
 import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+
 import boto3
 from PIL import Image
 import torch
 import torchvision.transforms as transforms
 
-s3 = boto3.client('s3')
-MODEL_BUCKET = os.environ['MODEL_BUCKET']
+from metrics import Metrics
+import recorder
+from phash import HashIndex, image_hash
+
+s3 = boto3.client('s3', endpoint_url=os.environ.get('AWS_ENDPOINT_URL'))
+# Read lazily so the module can be imported without AWS configuration
+MODEL_BUCKET = os.environ.get('MODEL_BUCKET')
 
 # Load model (global to reuse across invocations)
 model = None
+feature_extractor = None
 class_names = None
+model_version = os.environ.get('MODEL_VERSION', 'unknown')
+
+# Built once instead of per request
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
+# Hourly prediction rollups (STATS_TABLE) and prediction records for active
+# learning (DATA_TABLE, IMAGES_BUCKET) are written by recorder.py, off the
+# hot path when RECORD_QUEUE_URL is set; each is off when its table is unset
+
+# Exact-repeat cache: identical payloads reuse the previous prediction
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '256'))
+prediction_cache = OrderedDict()
+
+# Near-identical frames (image hash within this many bits) of a cached image
+# reuse its prediction; 0 disables
+NEAR_DUPLICATE_DISTANCE = int(os.environ.get('NEAR_DUPLICATE_DISTANCE', '0'))
+recent_frames = HashIndex(NEAR_DUPLICATE_DISTANCE)
+
 
 def load_model():
-    global model, class_names
+    global model, feature_extractor, class_names, model_version
     if model is None:
+        if not MODEL_BUCKET:
+            raise RuntimeError("MODEL_BUCKET is not set")
+
         # Download model
         s3.download_file(MODEL_BUCKET, 'model.pth', '/tmp/model.pth')
         s3.download_file(MODEL_BUCKET, 'model_metadata.json', '/tmp/model_metadata.json')
@@ -25,58 +60,136 @@ def load_model():
         with open('/tmp/model_metadata.json', 'r') as f:
             metadata = json.load(f)
             class_names = metadata['class_names']
+            model_version = metadata.get('model_version', model_version)
         
         # Load model
         from torchvision.models import resnet18
         model = resnet18(num_classes=len(class_names))
         model.load_state_dict(torch.load('/tmp/model.pth', map_location='cpu'))
         model.eval()
+        # Everything but the final fc layer: 512-d pooled features (shares weights)
+        feature_extractor = torch.nn.Sequential(*list(model.children())[:-1])
+
+
+def parse_body(event):
+    """Parse body (handle both direct invoke and API Gateway format)"""
+    if 'body' in event:
+        if isinstance(event['body'], str):
+            return json.loads(event['body'])
+        return event['body']
+    return event
+
+
+def run_inference(body, metrics):
+    """
+    Classify the image in body; returns the result dict, or None if no
+    image was provided. Stage timings go to metrics.
+    """
+    # Support both 'image' and 'image_data' field names
+    image_b64 = body.get('image') or body.get('image_data')
+    if not image_b64:
+        return None
+
+    cache_key = hashlib.sha256(image_b64.encode('utf-8')).hexdigest()
+    if cache_key in prediction_cache:
+        return cached_result(cache_key, body, metrics)
+
+    with metrics.stage('model_load'):
+        load_model()
+
+    # Decode image
+    with metrics.stage('b64_decode'):
+        image_bytes = base64.b64decode(image_b64)
+    with metrics.stage('image_decode'):
+        opened = Image.open(io.BytesIO(image_bytes))
+        image_format = (opened.format or 'png').lower()
+        image = opened.convert('RGB')
+
+    frame_hash = None
+    if NEAR_DUPLICATE_DISTANCE > 0 and PREDICTION_CACHE_SIZE > 0:
+        with metrics.stage('hash_lookup'):
+            frame_hash = image_hash(image)
+            match = recent_frames.nearest(frame_hash)
+        if match is not None:
+            metrics.put('near_duplicate_hit', 1)
+            return cached_result(match[0], body, metrics, near_duplicate_distance=match[1])
+
+    # Preprocess
+    with metrics.stage('preprocess'):
+        img_tensor = transform(image).unsqueeze(0)
+
+    # Inference
+    with metrics.stage('forward'):
+        with torch.no_grad():
+            features = torch.flatten(feature_extractor(img_tensor), 1)
+            outputs = model.fc(features)
+            probabilities = torch.nn.functional.softmax(outputs, dim=1)
+            confidence, predicted = torch.max(probabilities, 1)
+
+    prediction = {
+        'predicted_class': class_names[predicted.item()],
+        'confidence': float(confidence.item())
+    }
+    metrics.set_dimensions(model_version=model_version, failure_mode=prediction['predicted_class'])
+    if PREDICTION_CACHE_SIZE > 0:
+        prediction_cache[cache_key] = prediction
+        if frame_hash is not None:
+            recent_frames.add(cache_key, frame_hash)
+        if len(prediction_cache) > PREDICTION_CACHE_SIZE:
+            evicted, _ = prediction_cache.popitem(last=False)
+            recent_frames.remove(evicted)
+
+    # Feedback (POST /feedback) addresses the record by image_id + inference_timestamp
+    timestamp = datetime.now(timezone.utc).isoformat()
+    record = None
+    if recorder.DATA_TABLE:
+        record = recorder.record_part(prediction, body, probabilities[0].tolist(),
+                                      features[0].to(torch.float16).numpy().tobytes(), image_bytes,
+                                      f"{cache_key[:32]}.{image_format}", timestamp, model_version)
+    record_side_effects(prediction, body, metrics, timestamp, record)
+    return {**prediction, 'image_id': body.get('image_id', 'unknown'), 'cache_hit': False,
+            'inference_timestamp': timestamp}
+
+
+def cached_result(cache_key, body, metrics, **extra):
+    """Reuse the cached prediction for an identical or near-identical image"""
+    cached = prediction_cache[cache_key]
+    prediction_cache.move_to_end(cache_key)
+    metrics.put('prediction_cache_hit', 1)
+    metrics.set_dimensions(model_version=model_version, failure_mode=cached['predicted_class'])
+    record_side_effects(cached, body, metrics, datetime.now(timezone.utc).isoformat())
+    return {**cached, 'image_id': body.get('image_id', 'unknown'), 'cache_hit': True, **extra}
+
+
+def record_side_effects(prediction, body, metrics, timestamp, record=None):
+    """
+    Rollup update, plus the prediction record for fresh predictions (cache
+    hits are not recorded: a repeat frame adds nothing to retraining).
+    Handed to the recorder queue; never fails the prediction.
+    """
+    message = {'record': record} if record else {}
+    if recorder.STATS_TABLE:
+        message['stats'] = recorder.stats_part(prediction, body, timestamp)
+    if message:
+        recorder.submit(message, metrics)
+
 
 def handler(event, context):
+    metrics = Metrics('inference')
     try:
-        load_model()
-        
-        # Parse body (handle both direct invoke and API Gateway format)
-        if 'body' in event:
-            if isinstance(event['body'], str):
-                body = json.loads(event['body'])
-            else:
-                body = event['body']
-        else:
-            body = event
+        with metrics.stage('body_parse'):
+            body = parse_body(event)
+        result = run_inference(body, metrics)
         
-        # Support both 'image' and 'image_data' field names
-        image_b64 = body.get('image') or body.get('image_data')
-        
-        if not image_b64:
+        if result is None:
+            metrics.put('bad_request', 1)
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': 'No image provided (expected "image" or "image_data" field)'})
             }
         
-        # Decode image
-        image_bytes = base64.b64decode(image_b64)
-        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        
-        # Preprocess
-        transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-        ])
-        img_tensor = transform(image).unsqueeze(0)
-        
-        # Inference
-        with torch.no_grad():
-            outputs = model(img_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            confidence, predicted = torch.max(probabilities, 1)
-        
-        result = {
-            'predicted_class': class_names[predicted.item()],
-            'confidence': float(confidence.item()),
-            'image_id': body.get('image_id', 'unknown')
-        }
+        with metrics.stage('serialize'):
+            response_body = json.dumps(result)
         
         return {
             'statusCode': 200,
@@ -84,11 +197,14 @@ def handler(event, context):
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(result)
+            'body': response_body
         }
         
     except Exception as e:
+        metrics.put('error', 1)
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        metrics.flush()
@@ -0,0 +1,152 @@
+"""
+Perceptual hashing and near-duplicate lookup.
+
+image_hash() turns an image into a 64-bit hash; re-captures of the same
+region that differ by noise, brightness or re-compression land a few bits
+apart. Plain dHash is dominated by the lighting gradient across steel
+strip frames (unrelated defects hash to near all-ones), so the 8x8
+thumbnail has its row and column means removed before thresholding.
+
+HashIndex finds stored hashes within a Hamming radius using multi-index
+hashing: the hash is split into 3 chunks (22/21/21 bits), and any hash
+within radius r matches at least one chunk within r // 3 bits, so a
+lookup probes a few dozen dict buckets instead of comparing every entry.
+Chunks of ~21 bits keep buckets near-empty up to a few million entries.
+"""
+import gzip
+import json
+from itertools import combinations
+
+from PIL import Image
+
+CHUNK_WIDTHS = (22, 21, 21)
+CHUNK_SHIFTS = (0, 22, 43)
+
+# Hash distance at or below which two frames count as the same capture
+DEFAULT_DISTANCE = 5
+
+
+def image_hash(image):
+    """64-bit hash of a PIL image, file path or file object"""
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    pixels = image.convert('L').resize((8, 8), Image.BOX).tobytes()
+
+    # Remove the lighting field (row and column means), keep the texture
+    rows = [sum(pixels[r * 8:r * 8 + 8]) / 8 for r in range(8)]
+    cols = [sum(pixels[c::8]) / 8 for c in range(8)]
+    residual = [pixels[i] - rows[i // 8] - cols[i % 8] for i in range(64)]
+    median = sorted(residual)[32]
+
+    value = 0
+    for x in residual:
+        value = (value << 1) | (x >= median)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _chunks(value):
+    return [(value >> shift) & ((1 << width) - 1) for shift, width in zip(CHUNK_SHIFTS, CHUNK_WIDTHS)]
+
+
+def _flip_masks(bits, radius):
+    """Every mask of up to `radius` set bits within a chunk"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(bits), r):
+            mask = 0
+            for p in positions:
+                mask |= 1 << p
+            masks.append(mask)
+    return masks
+
+
+class HashIndex:
+    """Multi-index hash table over 64-bit hashes, each stored with a key"""
+
+    def __init__(self, max_distance=DEFAULT_DISTANCE):
+        self.max_distance = max_distance
+        self.hashes = {}  # key -> hash
+        self.tables = [{} for _ in CHUNK_WIDTHS]  # chunk value -> [keys]
+        sub_radius = max_distance // len(CHUNK_WIDTHS)
+        self._masks = [_flip_masks(width, sub_radius) for width in CHUNK_WIDTHS]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, key):
+        return key in self.hashes
+
+    def add(self, key, value):
+        if key in self.hashes:
+            self.remove(key)
+        self.hashes[key] = value
+        for table, chunk in zip(self.tables, _chunks(value)):
+            table.setdefault(chunk, []).append(key)
+
+    def remove(self, key):
+        value = self.hashes.pop(key, None)
+        if value is None:
+            return
+        for table, chunk in zip(self.tables, _chunks(value)):
+            bucket = table[chunk]
+            bucket.remove(key)
+            if not bucket:
+                del table[chunk]
+
+    def within(self, value, max_distance=None):
+        """Every (key, distance) within radius, closest first"""
+        radius = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        matches = []
+        seen = set()
+        for table, masks, chunk in zip(self.tables, self._masks, _chunks(value)):
+            for mask in masks:
+                for key in table.get(chunk ^ mask, ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    distance = hamming(value, self.hashes[key])
+                    if distance <= radius:
+                        matches.append((key, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def nearest(self, value, max_distance=None):
+        """(key, distance) of the closest stored hash within radius, or None"""
+        matches = self.within(value, max_distance)
+        return matches[0] if matches else None
+
+    def add_if_new(self, key, value):
+        """Add unless a near-duplicate is stored; returns the match or None"""
+        match = self.nearest(value)
+        if match is None:
+            self.add(key, value)
+        return match
+
+    def save(self, path_or_file):
+        """Gzip JSON of {key: hex hash}"""
+        body = gzip.compress(json.dumps({
+            'max_distance': self.max_distance,
+            'hashes': {key: f"{value:016x}" for key, value in self.hashes.items()}
+        }, separators=(',', ':')).encode('utf-8'))
+        if hasattr(path_or_file, 'write'):
+            path_or_file.write(body)
+        else:
+            with open(path_or_file, 'wb') as f:
+                f.write(body)
+
+    @classmethod
+    def loads(cls, body, max_distance=None):
+        data = json.loads(gzip.decompress(body))
+        index = cls(data['max_distance'] if max_distance is None else max_distance)
+        for key, value in data['hashes'].items():
+            index.add(key, int(value, 16))
+        return index
+
+    @classmethod
+    def load(cls, path, max_distance=None):
+        with open(path, 'rb') as f:
+            return cls.loads(f.read(), max_distance)
@@ -0,0 +1,136 @@
+"""
+Incremental prediction aggregates: per-hour rollup items updated with
+atomic counters, so class mix / confidence quantiles / throughput never
+need a table scan.
+
+Each rollup item (key "<line>#<YYYYMMDDHH>") holds flat number attributes:
+    n                total predictions
+    conf_sum         sum of confidences
+    cls_<class>      per-class counts
+    hist_<00..09>    10-bin confidence histogram
+    sk_<i>           quantile sketch bins (relative-accuracy bins on 1 - confidence)
+Flat attributes let a single UpdateItem ADD create-or-increment them all.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+ALL_LINES = "ALL"
+HIST_BINS = 10
+
+# DDSketch-style bins on u = 1 - confidence: quantiles accurate to ~2% of u
+SKETCH_ALPHA = 0.02
+SKETCH_GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+SKETCH_MIN_U = 1e-4  # u below this (confidence > 0.9999) shares one bin
+BATCH_GET_SIZE = 100
+
+
+def hour_bucket(ts=None):
+    ts = ts or datetime.now(timezone.utc)
+    return ts.strftime('%Y%m%d%H')
+
+
+def rollup_key(line, bucket):
+    return f"{line}#{bucket}"
+
+
+def hist_bin(confidence):
+    return min(HIST_BINS - 1, max(0, int(confidence * HIST_BINS)))
+
+
+def sketch_bin(confidence):
+    u = max(SKETCH_MIN_U, 1.0 - confidence)
+    return int(math.ceil(math.log(u) / math.log(SKETCH_GAMMA)))
+
+
+def sketch_value(index):
+    """Representative confidence for a sketch bin (midpoint in u)"""
+    u = 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+    return max(0.0, 1.0 - u)
+
+
+def record_prediction(table, predicted_class, confidence, line=None, ts=None):
+    """Atomically add one prediction to the plant-wide and per-line rollups"""
+    bucket = hour_bucket(ts)
+    names = {
+        '#cls': f"cls_{predicted_class}",
+        '#hist': f"hist_{hist_bin(confidence):02d}",
+        '#sk': f"sk_{sketch_bin(confidence)}",
+    }
+    values = {':one': 1, ':conf': Decimal(str(round(confidence, 6)))}
+    update = "ADD n :one, conf_sum :conf, #cls :one, #hist :one, #sk :one"
+
+    for line_id in {ALL_LINES, line or ALL_LINES}:
+        table.update_item(
+            Key={'stat_key': rollup_key(line_id, bucket)},
+            UpdateExpression=update,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+
+def read_window(dynamodb, table_name, hours=24, line=ALL_LINES, now=None):
+    """Fetch the last `hours` hourly rollups: O(hours) key reads, no scan"""
+    now = now or datetime.now(timezone.utc)
+    buckets = [hour_bucket(now - timedelta(hours=h)) for h in range(hours)]
+    keys = [{'stat_key': rollup_key(line, b)} for b in buckets]
+
+    items = []
+    for i in range(0, len(keys), BATCH_GET_SIZE):
+        request = {table_name: {'Keys': keys[i:i + BATCH_GET_SIZE]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys') or None
+    return items
+
+
+def merge(items):
+    """Sum rollup items into one aggregate"""
+    total = {'n': 0, 'conf_sum': 0.0, 'classes': {}, 'hist': [0] * HIST_BINS,
+             'sketch': {}, 'per_hour': {}}
+    for item in items:
+        n = int(item.get('n', 0))
+        total['n'] += n
+        total['conf_sum'] += float(item.get('conf_sum', 0))
+        total['per_hour'][item['stat_key'].rsplit('#', 1)[-1]] = n
+        for attr, value in item.items():
+            if attr.startswith('cls_'):
+                total['classes'][attr[4:]] = total['classes'].get(attr[4:], 0) + int(value)
+            elif attr.startswith('hist_'):
+                total['hist'][int(attr[5:])] += int(value)
+            elif attr.startswith('sk_'):
+                index = int(attr[3:])
+                total['sketch'][index] = total['sketch'].get(index, 0) + int(value)
+    return total
+
+
+def quantile(sketch, q):
+    """Confidence quantile q (0..1) from sketch bins"""
+    count = sum(sketch.values())
+    if not count:
+        return None
+    # Higher u means lower confidence, so walk bins from largest u down
+    rank = q * (count - 1)
+    seen = 0
+    for index in sorted(sketch, reverse=True):
+        seen += sketch[index]
+        if seen > rank:
+            return sketch_value(index)
+    return sketch_value(min(sketch))
+
+
+def psi(expected, actual, epsilon=1e-4):
+    """Population stability index between two distributions (dict or list)"""
+    if isinstance(expected, dict):
+        keys = set(expected) | set(actual)
+        expected = [expected.get(k, 0) for k in keys]
+        actual = [actual.get(k, 0) for k in keys]
+    e_total = sum(expected) or 1
+    a_total = sum(actual) or 1
+    score = 0.0
+    for e, a in zip(expected, actual):
+        e_share = max(e / e_total, epsilon)
+        a_share = max(a / a_total, epsilon)
+        score += (a_share - e_share) * math.log(a_share / e_share)
+    return score
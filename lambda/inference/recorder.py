@@ -0,0 +1,151 @@
+"""
+Side-effect writes of a prediction, kept off the inference hot path.
+
+Each prediction produces one message:
+    stats    hourly rollup update (prediction_stats.record_prediction)
+    record   prediction record for active learning (fresh predictions only),
+             with the image inline when it fits in an SQS message
+
+With RECORD_QUEUE_URL set, the handler makes a single SQS send and the
+recorder worker (worker_handler, SQS-triggered) does the S3 and DynamoDB
+writes; failed messages are redelivered and end in the DLQ. Without a
+queue, or if the send fails, the same writes run inline. Delivery is
+at-least-once, so a redelivered message can count twice in the rollups.
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+
+from prediction_stats import record_prediction
+
+RECORD_QUEUE_URL = os.environ.get('RECORD_QUEUE_URL')
+STATS_TABLE = os.environ.get('STATS_TABLE')
+DATA_TABLE = os.environ.get('DATA_TABLE')
+IMAGES_BUCKET = os.environ.get('IMAGES_BUCKET')
+
+# SQS caps messages at 256 KB; base64 adds a third, leave room for the rest
+MAX_QUEUED_IMAGE_BYTES = 180 * 1024
+
+# Created lazily so the module imports without AWS configuration
+sqs = None
+s3 = None
+stats_table = None
+data_table = None
+
+
+def _dynamodb_table(name):
+    return boto3.resource('dynamodb', endpoint_url=os.environ.get('AWS_ENDPOINT_URL')).Table(name)
+
+
+def stats_part(prediction, body, timestamp):
+    return {'predicted_class': prediction['predicted_class'], 'confidence': prediction['confidence'],
+            'line': body.get('line_id'), 'timestamp': timestamp}
+
+
+def record_part(prediction, body, probabilities, embedding, image_bytes, filename, timestamp,
+                model_version):
+    """
+    Prediction record as JSON-safe fields. The image rides along in the
+    message; one too big for SQS is uploaded right away instead.
+    """
+    record = {
+        'image_id': body.get('image_id', 'unknown'),
+        'inference_timestamp': timestamp,
+        'predicted_class': prediction['predicted_class'],
+        'confidence': round(prediction['confidence'], 6),
+        'probabilities': [round(p, 6) for p in probabilities],
+        # float16 bytes: 1 KB instead of a 512-number list
+        'embedding': base64.b64encode(embedding).decode('ascii'),
+        'model_version': model_version
+    }
+    if IMAGES_BUCKET:
+        record['image_key'] = f"predictions/{timestamp[:10]}/{filename}"
+        if not RECORD_QUEUE_URL or len(image_bytes) <= MAX_QUEUED_IMAGE_BYTES:
+            record['image'] = base64.b64encode(image_bytes).decode('ascii')
+        else:
+            try:
+                put_image(record['image_key'], image_bytes)
+            except Exception as e:
+                print(f"Error: image upload failed: {str(e)}")
+                del record['image_key']
+    return record
+
+
+def put_image(key, image_bytes):
+    global s3
+    if s3 is None:
+        s3 = boto3.client('s3', endpoint_url=os.environ.get('AWS_ENDPOINT_URL'))
+    s3.put_object(Bucket=IMAGES_BUCKET, Key=key, Body=image_bytes)
+
+
+def write(message):
+    """Perform a message's writes; raises on failure (record first, it is idempotent)"""
+    global stats_table, data_table
+    record = message.get('record')
+    if record and DATA_TABLE:
+        record = dict(record)
+        image = record.pop('image', None)
+        if image is not None:
+            put_image(record['image_key'], base64.b64decode(image))
+        record['confidence'] = Decimal(str(record['confidence']))
+        record['probabilities'] = [Decimal(str(p)) for p in record['probabilities']]
+        record['embedding'] = base64.b64decode(record['embedding'])
+        key = {'image_id': record.pop('image_id'), 'inference_timestamp': record.pop('inference_timestamp')}
+        if data_table is None:
+            data_table = _dynamodb_table(DATA_TABLE)
+        # SET rather than put_item: feedback may have labelled the record already
+        names = {f"#f{i}": field for i, field in enumerate(record)}
+        data_table.update_item(
+            Key=key,
+            UpdateExpression="SET " + ", ".join(f"{name} = :v{name[2:]}" for name in names),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={f":v{i}": value for i, value in enumerate(record.values())}
+        )
+
+    stats = message.get('stats')
+    if stats and STATS_TABLE:
+        if stats_table is None:
+            stats_table = _dynamodb_table(STATS_TABLE)
+        record_prediction(stats_table, stats['predicted_class'], stats['confidence'],
+                          line=stats.get('line'), ts=datetime.fromisoformat(stats['timestamp']))
+
+
+def submit(message, metrics):
+    """Queue the message for the recorder worker; writes inline without a queue"""
+    global sqs
+    if RECORD_QUEUE_URL:
+        try:
+            with metrics.stage('record_enqueue'):
+                if sqs is None:
+                    sqs = boto3.client('sqs')
+                sqs.send_message(QueueUrl=RECORD_QUEUE_URL, MessageBody=json.dumps(message))
+            return
+        except Exception as e:
+            print(f"Error: record handoff failed, writing inline: {str(e)}")
+            metrics.put('record_enqueue_error', 1)
+
+    # Best-effort inline: a failed write never fails the prediction
+    try:
+        with metrics.stage('record_write'):
+            write(message)
+    except Exception as e:
+        print(f"Error: prediction record/stats write failed: {str(e)}")
+        metrics.put('record_error', 1)
+
+
+def worker_handler(event, context):
+    """SQS-triggered; failed records are returned for redelivery"""
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            write(json.loads(record['body']))
+        except Exception as e:
+            print(f"Error: record {record['messageId']}: {str(e)}")
+            failures.append({'itemIdentifier': record['messageId']})
+    print(json.dumps({'event': 'records_written', 'count': len(event.get('Records', [])) - len(failures),
+                      'failed': len(failures)}))
+    return {'batchItemFailures': failures}
@@ -0,0 +1,87 @@
+"""
+Hot-path instrumentation shared by the Lambda handlers.
+
+Times named stages and emits one CloudWatch Embedded Metric Format (EMF)
+log line per invocation. Set CAPA_METRICS=off to disable; stage timings
+are still recorded into an explicit trace dict (pipeline responses).
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get('CAPA_METRICS', 'on').lower() not in ('off', 'false', '0')
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'CapaAIEngine')
+DIMENSION_KEYS = ['Service', 'ModelVersion', 'FailureMode']
+
+# True until the first Metrics object in this container is created
+_cold_start = True
+
+
+class Metrics:
+    """Per-invocation collector; call flush() once at the end"""
+
+    def __init__(self, service, trace=None, **dimensions):
+        global _cold_start
+        self.enabled = METRICS_ENABLED
+        self.trace = trace
+        self.dimensions = {'Service': service, 'ModelVersion': 'unknown', 'FailureMode': 'unknown'}
+        self.set_dimensions(**dimensions)
+        self.values = {}
+        self.units = {}
+        self.cold_start = _cold_start
+        _cold_start = False
+
+    def set_dimensions(self, model_version=None, failure_mode=None):
+        if model_version:
+            self.dimensions['ModelVersion'] = str(model_version)
+        if failure_mode:
+            self.dimensions['FailureMode'] = str(failure_mode)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage as <name>_ms (accumulates if the stage repeats)"""
+        if not self.enabled and self.trace is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_ms(name, (time.perf_counter() - start) * 1000)
+
+    def record_ms(self, name, ms):
+        """Record an externally measured stage duration"""
+        if self.trace is not None:
+            self.trace[name] = round(self.trace.get(name, 0) + ms, 3)
+        if self.enabled:
+            self.put(f"{name}_ms", ms, 'Milliseconds')
+
+    def put(self, name, value, unit='Count'):
+        """Add to a metric (counts and token totals accumulate)"""
+        if not self.enabled or value is None:
+            return
+        self.values[name] = self.values.get(name, 0) + value
+        self.units[name] = unit
+
+    def flush(self):
+        """Print the EMF line; CloudWatch extracts the metrics from the log"""
+        if not self.enabled:
+            return
+        self.values['ColdStart'] = 1 if self.cold_start else 0
+        self.units['ColdStart'] = 'Count'
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [DIMENSION_KEYS],
+                    'Metrics': [{'Name': name, 'Unit': self.units[name]} for name in self.values]
+                }]
+            },
+            **self.dimensions,
+            **{name: round(value, 3) for name, value in self.values.items()}
+        }
+        print(json.dumps(record))
+        self.values = {}
+        self.units = {}
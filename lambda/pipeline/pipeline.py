@@ -0,0 +1,116 @@
+"""
+Fused image-to-CAPA pipeline: inference and report generation in one
+request, with per-stage timings returned in a trace (and emitted as EMF metrics).
+
+Expected input (same as the inference API, plus optional overrides):
+{
+    "image_data": "<base64>",
+    "image_id": "Cr_1.bmp",
+    "min_confidence": 0.6        (optional, defaults to MIN_REPORT_CONFIDENCE)
+}
+"""
+import importlib.util
+import json
+import os
+import sys
+import time
+
+# Works both in the container (handlers beside this file) and in the repo
+_here = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = _here if os.path.isdir(os.path.join(_here, 'inference')) else os.path.dirname(_here)
+
+# In the repo the metrics module lives in the layer directory
+_metrics_dir = os.path.join(LAMBDA_DIR, 'metrics_layer', 'python')
+if os.path.isdir(_metrics_dir):
+    sys.path.insert(0, _metrics_dir)
+
+from metrics import Metrics  # noqa: E402
+
+# Skip report generation for low-confidence detections
+MIN_REPORT_CONFIDENCE = float(os.environ.get('MIN_REPORT_CONFIDENCE', '0.5'))
+
+
+def _load_handlers():
+    """Import both handlers; each directory has its own handler.py"""
+    # Appended (not prepended) so inference/handler.py never shadows the report handler
+    inference_dir = os.path.join(LAMBDA_DIR, 'inference')
+    if inference_dir not in sys.path:
+        sys.path.append(inference_dir)
+
+    spec = importlib.util.spec_from_file_location(
+        'inference_handler', os.path.join(LAMBDA_DIR, 'inference', 'handler.py')
+    )
+    inference = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(inference)
+
+    sys.path.insert(0, os.path.join(LAMBDA_DIR, 'report_generator'))
+    import handler as report_generator
+
+    return inference, report_generator
+
+
+inference_handler, report_handler = _load_handlers()
+
+
+def run_pipeline(body, metrics):
+    """Returns (inference result or None, report or None, skip reason or None)"""
+    result = inference_handler.run_inference(body, metrics)
+    if result is None:
+        return None, None, None
+
+    min_confidence = float(body.get('min_confidence', MIN_REPORT_CONFIDENCE))
+    if result['cache_hit']:
+        return result, None, 'cache_hit'
+    if result['confidence'] < min_confidence:
+        return result, None, 'below_confidence_threshold'
+
+    report = report_handler.generate_and_save_report({
+        'image_id': result['image_id'],
+        'failure_mode': result['predicted_class'],
+        'confidence': str(round(result['confidence'], 4))
+    }, metrics=metrics)
+    return result, report, None
+
+
+def handler(event, context):
+    trace = {}
+    metrics = Metrics('pipeline', trace=trace)
+    start = time.perf_counter()
+    try:
+        with metrics.stage('body_parse'):
+            body = inference_handler.parse_body(event)
+
+        result, report, skip_reason = run_pipeline(body, metrics)
+        if skip_reason:
+            metrics.put(f'report_skipped_{skip_reason}', 1)
+        trace['total'] = round((time.perf_counter() - start) * 1000, 3)
+
+        if result is None:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'No image provided (expected "image" or "image_data" field)'})
+            }
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'inference': result,
+                'report': report,
+                'report_skipped': skip_reason,
+                'trace': trace
+            }, default=str)
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        metrics.put('error', 1)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e), 'trace': trace})
+        }
+    finally:
+        metrics.flush()
@@ -0,0 +1,181 @@
+import argparse
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+REPORTS_PREFIX = "reports/"
+ROLLUPS_PREFIX = "rollups/"
+
+# Spill rollups to disk beyond this size instead of holding them in memory
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+
+def report_key(report):
+    """
+    reports/dt=YYYY-MM-DD/failure_mode=<mode>/<report_id>.json.gz
+    failure_mode and report_id come from request input, so they are
+    percent-encoded ('/' and '=' would otherwise break the partitions).
+    """
+    day = report['created_at'][:10]
+    return (
+        f"{REPORTS_PREFIX}dt={quote(day, safe='')}/"
+        f"failure_mode={quote(str(report['failure_mode']), safe='')}/"
+        f"{quote(str(report['report_id']), safe='')}.json.gz"
+    )
+
+
+def encode_report(report):
+    """Compact JSON, gzip-compressed"""
+    body = json.dumps(report, separators=(',', ':'), default=str).encode('utf-8')
+    return gzip.compress(body)
+
+
+def decode_report(body):
+    return json.loads(gzip.decompress(body))
+
+
+def rollup_keys(day):
+    """(data key, index key) for a day's rollup"""
+    prefix = f"{ROLLUPS_PREFIX}dt={day}/"
+    return f"{prefix}reports.jsonl.gz", f"{prefix}index.json"
+
+
+def _list_keys(s3, bucket, prefix):
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            yield obj['Key']
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+def compact_day(s3, bucket, day, delete_source=False):
+    """
+    Roll all of a day's reports into one gzip JSONL file plus a small
+    index (line number per report, counts per failure mode).
+    An existing rollup is carried forward and only reports it does not
+    hold yet are appended, so a re-run (e.g. for a late report) keeps
+    reports whose sources were already deleted.
+    Reports are streamed one at a time; the rollup is spooled to disk.
+    """
+    data_key, index_key = rollup_keys(day)
+    index = {'day': day, 'count': 0, 'failure_modes': {}, 'reports': {}}
+    source_keys = []
+    added = 0
+
+    def append(out, report):
+        out.write(json.dumps(report, separators=(',', ':'), default=str).encode('utf-8'))
+        out.write(b"\n")
+        mode = report.get('failure_mode', 'unknown')
+        index['reports'][report['report_id']] = {'line': index['count'], 'failure_mode': mode}
+        index['failure_modes'][mode] = index['failure_modes'].get(mode, 0) + 1
+        index['count'] += 1
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        with gzip.GzipFile(fileobj=spool, mode='wb') as out:
+            try:
+                for report in iter_rollup(s3, bucket, day):
+                    append(out, report)
+            except s3.exceptions.NoSuchKey:
+                pass
+
+            for key in _list_keys(s3, bucket, f"{REPORTS_PREFIX}dt={day}/"):
+                if not key.endswith('.json.gz'):
+                    continue
+                report = decode_report(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+                # Reports are immutable, so one already rolled up is not appended twice
+                if report['report_id'] not in index['reports']:
+                    append(out, report)
+                    added += 1
+                source_keys.append(key)
+
+        if added:
+            spool.seek(0)
+            s3.put_object(Bucket=bucket, Key=data_key, Body=spool,
+                          ContentType='application/x-ndjson', ContentEncoding='gzip')
+            s3.put_object(Bucket=bucket, Key=index_key, Body=json.dumps(index, separators=(',', ':')),
+                          ContentType='application/json')
+
+    # Sources go only once the rollup holding them is written
+    if delete_source:
+        for i in range(0, len(source_keys), 1000):
+            s3.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in source_keys[i:i + 1000]]}
+            )
+
+    index['added'] = added
+    return index
+
+
+def read_index(s3, bucket, day):
+    _, index_key = rollup_keys(day)
+    return json.loads(s3.get_object(Bucket=bucket, Key=index_key)['Body'].read())
+
+
+def iter_rollup(s3, bucket, day, failure_mode=None):
+    """Stream reports from a day's rollup without loading it into memory"""
+    data_key, _ = rollup_keys(day)
+    body = s3.get_object(Bucket=bucket, Key=data_key)['Body']
+    with gzip.GzipFile(fileobj=body, mode='rb') as stream:
+        for line in stream:
+            report = json.loads(line)
+            if failure_mode is None or report.get('failure_mode') == failure_mode:
+                yield report
+
+
+def iter_rollups(s3, bucket, start_day, end_day, failure_mode=None):
+    """Stream reports from every rollup between two YYYY-MM-DD days (inclusive)"""
+    day = datetime.strptime(start_day, '%Y-%m-%d')
+    end = datetime.strptime(end_day, '%Y-%m-%d')
+    while day <= end:
+        try:
+            yield from iter_rollup(s3, bucket, day.strftime('%Y-%m-%d'), failure_mode)
+        except s3.exceptions.NoSuchKey:
+            pass
+        day += timedelta(days=1)
+
+
+def compaction_handler(event, context):
+    """
+    Scheduled daily: compact yesterday's reports (or event['day']).
+    With DELETE_COMPACTED=true the sources get delete markers (the bucket is
+    versioned); the bucket's lifecycle rule expires the old versions.
+    """
+    import boto3
+
+    day = event.get('day') or (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+    index = compact_day(
+        boto3.client('s3'), os.environ['REPORTS_BUCKET'], day,
+        delete_source=os.environ.get('DELETE_COMPACTED', 'false').lower() == 'true'
+    )
+    print(json.dumps({'event': 'compaction', 'day': day, 'count': index['count'],
+                      'added': index['added'], 'failure_modes': index['failure_modes']}))
+    return {'day': day, 'count': index['count']}
+
+
+if __name__ == "__main__":
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Compact or read daily CAPA report rollups")
+    parser.add_argument('command', choices=['compact', 'read'])
+    parser.add_argument('--bucket', required=True)
+    parser.add_argument('--day', required=True, help='YYYY-MM-DD')
+    parser.add_argument('--end-day', help='Last day to read (inclusive)')
+    parser.add_argument('--failure-mode')
+    parser.add_argument('--delete-source', action='store_true')
+    args = parser.parse_args()
+
+    s3_client = boto3.client('s3')
+    if args.command == 'compact':
+        result = compact_day(s3_client, args.bucket, args.day, args.delete_source)
+        print(json.dumps({k: result[k] for k in ('day', 'count', 'failure_modes')}))
+    else:
+        for report in iter_rollups(s3_client, args.bucket, args.day, args.end_day or args.day,
+                                   args.failure_mode):
+            print(json.dumps(report, default=str))
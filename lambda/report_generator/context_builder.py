@@ -0,0 +1,62 @@
+import json
+import os
+
+# Approximate token budget for reference material in the prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '1500'))
+
+# Bookkeeping fields that carry no useful content for the LLM
+# (content_hash / imported_at are added by seed_data/bulk_import.py)
+NON_CONTENT_FIELDS = {'report_id', 'created_at', 'is_seed', 'confidence', 'image_id', 'status',
+                      'seed_failure_mode', 'content_hash', 'imported_at'}
+
+# Claude tokenizes English/JSON at roughly 4 characters per token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (no tokenizer download needed)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_reference(report):
+    """Serialize a reference report without whitespace or bookkeeping fields"""
+    content = {k: v for k, v in report.items() if k not in NON_CONTENT_FIELDS}
+    return json.dumps(content, separators=(',', ':'), default=str)
+
+
+def build_context(failure_mode, similar_reports, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Pack as many top-ranked references as fit the token budget.
+    similar_reports is assumed to be ordered best match first; the best
+    one is always included, truncated if it alone exceeds the budget.
+    References whose content repeats one already packed are skipped.
+
+    Returns (context_text, estimated_tokens, references_used)
+    """
+    if not similar_reports:
+        return "", 0, 0
+
+    header = f"\n\nHere are reference CAPA reports for {failure_mode}:\n"
+    used_tokens = estimate_tokens(header)
+    blocks = []
+    seen = set()
+
+    for report in similar_reports:
+        block = compact_reference(report)
+        if block in seen:
+            continue
+        seen.add(block)
+        block_tokens = estimate_tokens(block) + 1  # newline separator
+        if used_tokens + block_tokens > token_budget:
+            if blocks:
+                break
+            # Over-budget best match: keep what fits rather than no context at all
+            block = block[:max(0, token_budget - used_tokens - 2) * CHARS_PER_TOKEN] + "…"
+            block_tokens = estimate_tokens(block) + 1
+        blocks.append(block)
+        used_tokens += block_tokens
+
+    if not blocks:
+        return "", 0, 0
+
+    return header + "\n".join(blocks), used_tokens, len(blocks)
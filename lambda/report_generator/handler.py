@@ -1,18 +1,62 @@
 import json
 import boto3
 import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
-# Force region for all boto3 clients
-REGION = 'us-east-1'
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from archive import report_key
+from context_builder import build_context, estimate_tokens
+from metrics import Metrics
+from job_queue import WORKER_CONCURRENCY, get_job_queue
+from persistence import PERSIST_JOB, WRITE_BEHIND, persist_job, persist_report
+from report_validation import (
+    REPORT_SCHEMA,
+    build_section_prompt,
+    extract_section,
+    extract_sections,
+    split_valid_sections,
+    validate_section,
+)
+
+# Force region for all boto3 clients (CAPA_REGION overrides, e.g. for local stand-ins)
+REGION = os.environ.get('CAPA_REGION', 'us-east-1')
+# Point DynamoDB/S3 at a local endpoint (moto server, LocalStack) when set
+ENDPOINT_URL = os.environ.get('AWS_ENDPOINT_URL')
 bedrock = boto3.client('bedrock-runtime', region_name=REGION)
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
-s3 = boto3.client('s3', region_name=REGION)
+dynamodb = boto3.resource('dynamodb', region_name=REGION, endpoint_url=ENDPOINT_URL)
+s3 = boto3.client('s3', region_name=REGION, endpoint_url=ENDPOINT_URL)
 
 REPORTS_TABLE = os.environ['REPORTS_TABLE']
 REPORTS_BUCKET = os.environ['REPORTS_BUCKET']
-MODEL_ID = "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0"
+MODEL_ID = os.environ.get(
+    'BEDROCK_MODEL_ID',
+    "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0"
+)
+# Metrics dimension: model name without the ARN prefix
+MODEL_VERSION = MODEL_ID.rsplit('/', 1)[-1]
+
+# Token limits for full generation vs. single-section regeneration
+FULL_MAX_TOKENS = 4000
+SECTION_MAX_TOKENS = int(os.environ.get('SECTION_MAX_TOKENS', '800'))
+SECTION_MAX_RETRIES = int(os.environ.get('SECTION_MAX_RETRIES', '2'))
+
+# Seed references fetched per report (newest first), then packed into the token budget
+MAX_REFERENCES = int(os.environ.get('MAX_REFERENCES', '5'))
+# Sparse GSI: only seed reports carry seed_failure_mode
+SEED_INDEX = 'seed-failure-mode-index'
+
+# Async mode: POST enqueues a job and returns a job_id immediately
+ASYNC_REPORTS = os.environ.get('ASYNC_REPORTS', 'false').lower() == 'true'
+job_queue = None
+_job_queue_lock = threading.Lock()
+# Deliveries before SQS moves a job to the DLQ (the queue's max_receive_count)
+JOB_MAX_RECEIVES = int(os.environ.get('JOB_MAX_RECEIVES', '3'))
 
 
 def lambda_handler(event, context):
@@ -21,50 +65,35 @@ def lambda_handler(event, context):
     {
         "image_id": "Cr_1.bmp",
         "failure_mode": "Crazing",
-        "confidence": "0.99"
+        "confidence": "0.99",
+        "async": true            (optional, defaults to ASYNC_REPORTS)
     }
+
+    GET /reports/{job_id} returns job status and the finished report.
     """
     try:
+        if event.get('httpMethod') == 'GET':
+            job_id = (event.get('pathParameters') or {}).get('job_id')
+            return get_job_status(job_id)
+
         body = json.loads(event['body']) if 'body' in event else event
-        
-        image_id = body['image_id']
-        failure_mode = body['failure_mode']
-        confidence = body.get('confidence', '0.0')
-        
-        # Step 1: Retrieve similar reports (RAG - simplified for now)
-        similar_reports = get_similar_reports(failure_mode)
-        
-        # Step 2: Generate CAPA report using Bedrock
-        report_data = generate_capa_report(failure_mode, similar_reports)
-        
-        # Step 3: Save to DynamoDB and S3
-        report_id = f"CAPA_{image_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        full_report = {
-            "report_id": report_id,
-            "created_at": datetime.now().isoformat(),
-            "image_id": image_id,
-            "failure_mode": failure_mode,
-            "confidence": confidence,
-            "is_seed": False,
-            **report_data
-        }
-        
-        # DynamoDB
-        table = dynamodb.Table(REPORTS_TABLE)
-        table.put_item(Item=json.loads(json.dumps(full_report), parse_float=Decimal))
-        
-        # S3
-        s3.put_object(
-            Bucket=REPORTS_BUCKET,
-            Key=f"reports/{report_id}.json",
-            Body=json.dumps(full_report, indent=2)
-        )
-        
+
+        if body.get('async', ASYNC_REPORTS):
+            return enqueue_report_job(body)
+
+        metrics = Metrics('report_generator', model_version=MODEL_VERSION)
+        try:
+            full_report = generate_and_save_report(body, metrics=metrics)
+        except Exception:
+            metrics.put('error', 1)
+            raise
+        finally:
+            metrics.flush()
+
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'report_id': report_id,
+                'report_id': full_report['report_id'],
                 'report': full_report
             })
         }
@@ -77,31 +106,243 @@ def lambda_handler(event, context):
         }
 
 
-def get_similar_reports(failure_mode):
-    """Retrieve seed report for this failure mode (simplified RAG)"""
-    table = dynamodb.Table(REPORTS_TABLE)
+def worker_handler(event, context):
+    """SQS-triggered worker; failed records are returned for redelivery"""
+    records = event.get('Records', [])
+
+    def process(record):
+        job = json.loads(record['body'])
+        metrics = Metrics('report_worker', model_version=MODEL_VERSION)
+        try:
+            process_job(job, metrics)
+        except Exception as e:
+            print(f"Error: job {job.get('job_id') or job['report'].get('report_id')}: {str(e)}")
+            metrics.put('error', 1)
+            if job.get('type') != PERSIST_JOB:
+                # SQS redelivers until max receives; only the last attempt is final
+                attempt = int(record.get('attributes', {}).get('ApproximateReceiveCount',
+                                                                JOB_MAX_RECEIVES))
+                mark_job(job, 'FAILED' if attempt >= JOB_MAX_RECEIVES else 'RETRYING', error=str(e))
+            raise
+        finally:
+            metrics.flush()
+
+    failures = []
+    with ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY) as executor:
+        futures = {executor.submit(process, record): record for record in records}
+        for future, record in futures.items():
+            if future.exception() is not None:
+                failures.append({'itemIdentifier': record['messageId']})
+
+    return {'batchItemFailures': failures}
+
+
+def process_job(job, metrics=None):
+    """One queued message: a report job, or a write-behind report to persist"""
+    metrics = metrics or Metrics('report_worker', model_version=MODEL_VERSION)
+    # SQS deletes the message on success, so writes must be durable first
+    if job.get('type') == PERSIST_JOB:
+        metrics.set_dimensions(failure_mode=job['report'].get('failure_mode'))
+        with metrics.stage('persist'):
+            latencies = persist_job(dynamodb.Table(REPORTS_TABLE), s3, REPORTS_BUCKET, job)
+        metrics.record_ms('dynamodb_write', latencies['dynamodb_ms'])
+        metrics.record_ms('s3_write', latencies['s3_ms'])
+        return
+    generate_and_save_report(job, job['job_id'], job['created_at'], write_behind=False,
+                             metrics=metrics)
+
+
+def generate_and_save_report(body, report_id=None, created_at=None, write_behind=WRITE_BEHIND,
+                             metrics=None):
+    """Retrieve references, generate the report and persist it"""
+    image_id = body['image_id']
+    failure_mode = body['failure_mode']
+    confidence = body.get('confidence', '0.0')
+    metrics = metrics or Metrics('report_generator', model_version=MODEL_VERSION)
+    metrics.set_dimensions(failure_mode=failure_mode)
+    
+    # Step 1: Retrieve similar reports (RAG - simplified for now)
+    with metrics.stage('retrieval'):
+        similar_reports = get_similar_reports(failure_mode)
+    
+    # Step 2: Generate CAPA report using Bedrock
+    with metrics.stage('llm'):
+        report_data = generate_capa_report(failure_mode, similar_reports, metrics)
+    
+    # Step 3: Save to DynamoDB and S3
+    report_id = report_id or f"CAPA_{image_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    full_report = {
+        "report_id": report_id,
+        "created_at": created_at or datetime.now().isoformat(),
+        "image_id": image_id,
+        "failure_mode": failure_mode,
+        "confidence": confidence,
+        "is_seed": False,
+        "status": "COMPLETE",
+        **report_data
+    }
     
-    # Query for seed reports with this failure mode
-    response = table.scan(
-        FilterExpression='failure_mode = :fm AND is_seed = :seed',
-        ExpressionAttributeValues={
-            ':fm': failure_mode,
-            ':seed': True
-        },
+    # DynamoDB + S3 in parallel (or queued for the worker when WRITE_BEHIND=true;
+    # the worker then records the write latencies)
+    with metrics.stage('persist'):
+        latencies = persist_report(
+            dynamodb.Table(REPORTS_TABLE), s3, REPORTS_BUCKET,
+            report_key(full_report), full_report, write_behind=write_behind,
+            queue=get_queue() if write_behind else None
+        )
+    if latencies:
+        metrics.record_ms('dynamodb_write', latencies['dynamodb_ms'])
+        metrics.record_ms('s3_write', latencies['s3_ms'])
+
+    return full_report
+
+
+def enqueue_report_job(body):
+    """Record a QUEUED job in the reports table and hand it to the worker"""
+    image_id = body['image_id']
+    job = {
+        "job_id": f"CAPA_{image_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}",
+        "created_at": datetime.now().isoformat(),
+        "image_id": image_id,
+        "failure_mode": body['failure_mode'],
+        "confidence": body.get('confidence', '0.0')
+    }
+
+    mark_job(job, 'QUEUED')
+    get_queue().enqueue(job)
+
+    return {
+        'statusCode': 202,
+        'body': json.dumps({'job_id': job['job_id'], 'status': 'QUEUED'})
+    }
+
+
+def mark_job(job, status, error=None):
+    """
+    Write a placeholder item for a job that has no finished report yet.
+    Never replaces a COMPLETE report (a duplicate SQS delivery can fail
+    after the first copy succeeded).
+    """
+    item = {
+        "report_id": job['job_id'],
+        "created_at": job['created_at'],
+        "image_id": job['image_id'],
+        "failure_mode": job['failure_mode'],
+        "confidence": job['confidence'],
+        "is_seed": False,
+        "status": status
+    }
+    if error:
+        item['error'] = error
+    try:
+        dynamodb.Table(REPORTS_TABLE).put_item(
+            Item=item,
+            ConditionExpression="attribute_not_exists(#s) OR #s <> :complete",
+            ExpressionAttributeNames={'#s': 'status'},
+            ExpressionAttributeValues={':complete': 'COMPLETE'}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(json.dumps({'event': 'mark_job_skipped', 'job_id': job['job_id'], 'status': status}))
+
+
+def get_job_status(job_id):
+    """Look up a job's status and, once COMPLETE, its report"""
+    if not job_id:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'No job_id provided'})
+        }
+
+    response = dynamodb.Table(REPORTS_TABLE).query(
+        KeyConditionExpression=Key('report_id').eq(job_id),
+        ScanIndexForward=False,
         Limit=1
     )
+    items = response.get('Items', [])
+    if not items:
+        return {
+            'statusCode': 404,
+            'body': json.dumps({'error': f'Unknown job_id: {job_id}'})
+        }
+
+    item = items[0]
+    result = {'job_id': job_id, 'status': item.get('status', 'COMPLETE')}
+    if result['status'] == 'COMPLETE':
+        result['report'] = item
+    elif 'error' in item:
+        result['error'] = item['error']
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(result, cls=DecimalEncoder)
+    }
+
+
+def get_queue():
+    """Lazily create the job queue so sync-only deployments never touch it"""
+    global job_queue
+    # Locked so concurrent first requests share one queue (an in-memory
+    # queue built by a losing thread would silently drop its jobs)
+    with _job_queue_lock:
+        if job_queue is None:
+            job_queue = get_job_queue()
+    return job_queue
+
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+
+def get_similar_reports(failure_mode, limit=MAX_REFERENCES):
+    """Seed reports for this failure mode, newest (best match) first"""
+    # The index only holds seeds, so Limit counts seeds, not scanned items
+    response = dynamodb.Table(REPORTS_TABLE).query(
+        IndexName=SEED_INDEX,
+        KeyConditionExpression=Key('seed_failure_mode').eq(failure_mode),
+        ScanIndexForward=False,
+        Limit=limit
+    )
     
     return response.get('Items', [])
 
 
-def generate_capa_report(failure_mode, similar_reports):
+def generate_capa_report(failure_mode, similar_reports, metrics):
     """Call Bedrock Claude to generate CAPA report"""
+    with metrics.stage('prompt_build'):
+        prompt, context, context_tokens, references_used = build_prompt(failure_mode, similar_reports)
+
+    report_text, usage = invoke_bedrock(prompt, FULL_MAX_TOKENS, metrics)
+
+    # Track prompt size over time (actual usage when Bedrock reports it)
+    print(json.dumps({
+        'event': 'prompt_size',
+        'failure_mode': failure_mode,
+        'references_used': references_used,
+        'context_tokens_est': context_tokens,
+        'prompt_tokens_est': estimate_tokens(prompt),
+        'input_tokens': usage.get('input_tokens'),
+        'output_tokens': usage.get('output_tokens')
+    }))
+
+    # Salvage valid sections; only re-prompt for missing/invalid ones
+    report, invalid = split_valid_sections(extract_sections(report_text))
+    if invalid:
+        report.update(regenerate_sections(failure_mode, context, invalid, usage, metrics))
+
+    return {"failure_mode": failure_mode, **report}
+
+
+def build_prompt(failure_mode, similar_reports):
+    """Returns (prompt, context, context_tokens, references_used)"""
     
-    # Build context from similar reports
-    context = ""
-    if similar_reports:
-        context = f"\n\nHere is a reference CAPA report for {failure_mode}:\n"
-        context += json.dumps(similar_reports[0], indent=2, default=str)
+    # Build compact, token-budgeted context from similar reports
+    context, context_tokens, references_used = build_context(failure_mode, similar_reports)
     
     prompt = f"""You are a quality engineering expert. Generate a detailed CAPA (Corrective and Preventive Action) report for a {failure_mode} defect.
 
@@ -140,23 +381,67 @@ Generate a comprehensive report with the following structure (return ONLY valid
 
 Generate realistic, detailed content for each field. Return ONLY the JSON object, no additional text."""
 
-    bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-    response = bedrock_client.invoke_model(
-        modelId=MODEL_ID,
-        body=json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 4000,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        })
-    )
-    
-    result = json.loads(response['body'].read())
-    report_text = result['content'][0]['text']
-    
-    # Parse JSON from response
-    return json.loads(report_text)
\ No newline at end of file
+    return prompt, context, context_tokens, references_used
+
+
+def regenerate_sections(failure_mode, context, section_names, full_usage, metrics):
+    """Re-prompt for individual sections with a small max_tokens"""
+    regenerated = {}
+    retries = {}
+    section_tokens = 0
+
+    for name in section_names:
+        retries[name] = 0
+        while name not in regenerated and retries[name] < SECTION_MAX_RETRIES:
+            retries[name] += 1
+            text, usage = invoke_bedrock(build_section_prompt(failure_mode, name, context),
+                                         SECTION_MAX_TOKENS, metrics)
+            section_tokens += usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
+
+            section = extract_section(text, name)
+            if validate_section(name, section):
+                regenerated[name] = {field: section[field] for field in REPORT_SCHEMA[name]}
+
+    metrics.put('section_retries', sum(retries.values()))
+
+    # Tokens a full retry would have cost, minus what the section retries cost
+    full_tokens = full_usage.get('input_tokens', 0) + full_usage.get('output_tokens', FULL_MAX_TOKENS)
+    print(json.dumps({
+        'event': 'section_regeneration',
+        'failure_mode': failure_mode,
+        'retries': retries,
+        'recovered': sorted(regenerated),
+        'tokens_used': section_tokens,
+        'tokens_saved': full_tokens - section_tokens
+    }))
+
+    missing = [name for name in section_names if name not in regenerated]
+    if missing:
+        raise ValueError(f"LLM output missing valid sections after retries: {missing}")
+
+    return regenerated
+
+
+def invoke_bedrock(prompt, max_tokens, metrics):
+    """Single Bedrock call; returns (text, usage)"""
+    with metrics.stage('bedrock_call'):
+        response = bedrock.invoke_model(
+            modelId=MODEL_ID,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": max_tokens,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            })
+        )
+
+        result = json.loads(response['body'].read())
+
+    usage = result.get('usage', {})
+    metrics.put('bedrock_input_tokens', usage.get('input_tokens'))
+    metrics.put('bedrock_output_tokens', usage.get('output_tokens'))
+    return result['content'][0]['text'], usage
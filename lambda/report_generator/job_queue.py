@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Max report jobs a single worker processes at once
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', '4'))
+
+
+class JobQueue:
+    """Minimal queue interface shared by SQS and the local stand-in"""
+
+    # Survives the process: safe to hand writes to before answering a request
+    durable = False
+
+    def enqueue(self, job):
+        raise NotImplementedError
+
+    def receive(self, max_messages=10):
+        """Return a list of (receipt, job) tuples"""
+        raise NotImplementedError
+
+    def ack(self, receipt):
+        raise NotImplementedError
+
+
+class SqsJobQueue(JobQueue):
+    """Report jobs on an SQS queue"""
+
+    durable = True
+
+    def __init__(self, queue_url, client=None):
+        import boto3
+        self.queue_url = queue_url
+        self.client = client or boto3.client('sqs')
+
+    def enqueue(self, job):
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(job))
+
+    def receive(self, max_messages=10):
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=1
+        )
+        return [
+            (message['ReceiptHandle'], json.loads(message['Body']))
+            for message in response.get('Messages', [])
+        ]
+
+    def ack(self, receipt):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+
+class SqliteJobQueue(JobQueue):
+    """Local stand-in for testing (in-memory by default)"""
+
+    def __init__(self, path=':memory:', visibility_timeout=60):
+        self.visibility_timeout = visibility_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "receipt TEXT PRIMARY KEY, body TEXT NOT NULL, visible_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def enqueue(self, job):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (receipt, body, visible_at) VALUES (?, ?, ?)",
+                (uuid.uuid4().hex, json.dumps(job), time.time())
+            )
+            self._conn.commit()
+
+    def receive(self, max_messages=10):
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT receipt, body FROM jobs WHERE visible_at <= ? ORDER BY rowid LIMIT ?",
+                (now, max_messages)
+            ).fetchall()
+            # Hide claimed jobs until acked or the visibility timeout expires
+            self._conn.executemany(
+                "UPDATE jobs SET visible_at = ? WHERE receipt = ?",
+                [(now + self.visibility_timeout, receipt) for receipt, _ in rows]
+            )
+            self._conn.commit()
+        return [(receipt, json.loads(body)) for receipt, body in rows]
+
+    def ack(self, receipt):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE receipt = ?", (receipt,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+
+def get_job_queue():
+    """SQS when JOB_QUEUE_URL is set, otherwise the SQLite stand-in"""
+    queue_url = os.environ.get('JOB_QUEUE_URL')
+    if queue_url:
+        return SqsJobQueue(queue_url)
+    return SqliteJobQueue(os.environ.get('JOB_QUEUE_DB', ':memory:'))
+
+
+def drain_queue(queue, process, max_workers=WORKER_CONCURRENCY):
+    """
+    Process jobs until the queue is empty, at most max_workers at a time.
+    Failed jobs are left unacked so they become visible again for retry.
+    Returns (succeeded, failed) counts.
+    """
+    succeeded = failed = 0
+
+    def run(receipt, job):
+        process(job)
+        queue.ack(receipt)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            messages = queue.receive(max_messages=max_workers)
+            if not messages:
+                break
+            futures = [executor.submit(run, receipt, job) for receipt, job in messages]
+            for future in futures:
+                try:
+                    future.result()
+                    succeeded += 1
+                except Exception as e:
+                    print(f"Error: {str(e)}")
+                    failed += 1
+
+    return succeeded, failed
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from archive import encode_report
+
+# Opt-in: return the report before DynamoDB/S3 writes are confirmed
+# (the writes are queued for the report worker)
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', 'false').lower() == 'true'
+PERSIST_MAX_RETRIES = int(os.environ.get('PERSIST_MAX_RETRIES', '3'))
+PERSIST_RETRY_BASE_DELAY = float(os.environ.get('PERSIST_RETRY_BASE_DELAY', '0.2'))
+PERSIST_JOB = "persist"
+
+# Shared across invocations of a warm container
+_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def to_dynamo(value):
+    """Convert floats to Decimal in a single pass (no json round trip)"""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamo(v) for v in value]
+    return value
+
+
+def _timed_with_retries(write):
+    """Run write() with exponential backoff; returns latency in ms"""
+    for attempt in range(1, PERSIST_MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            write()
+            return round((time.perf_counter() - start) * 1000, 2)
+        except Exception:
+            if attempt == PERSIST_MAX_RETRIES:
+                raise
+            time.sleep(PERSIST_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+
+
+def _persist(table, s3, bucket, key, report):
+    """Issue the DynamoDB and S3 writes concurrently; returns latencies"""
+    item = to_dynamo(report)
+    body = encode_report(report)
+
+    dynamo_future = _executor.submit(_timed_with_retries, lambda: table.put_item(Item=item))
+    s3_future = _executor.submit(
+        _timed_with_retries,
+        lambda: s3.put_object(Bucket=bucket, Key=key, Body=body,
+                              ContentType='application/json', ContentEncoding='gzip')
+    )
+
+    latencies = {}
+    errors = {}
+    for name, future in (('dynamodb_ms', dynamo_future), ('s3_ms', s3_future)):
+        try:
+            latencies[name] = future.result()
+        except Exception as e:
+            errors[name.replace('_ms', '')] = str(e)
+
+    if errors:
+        raise PersistenceError(report, errors)
+    return latencies
+
+
+class PersistenceError(Exception):
+    def __init__(self, report, errors):
+        super().__init__(f"Failed to persist {report.get('report_id')}: {errors}")
+        self.report = report
+        self.errors = errors
+
+
+def persist_message(key, report):
+    """Queue message carrying a write-behind report to the worker"""
+    return {'type': PERSIST_JOB, 'key': key, 'report': report}
+
+
+def persist_report(table, s3, bucket, key, report, write_behind=WRITE_BEHIND, queue=None):
+    """
+    Write report to DynamoDB and S3 in parallel.
+
+    Returns per-write latencies, or None in write-behind mode: the report
+    is handed to the job queue and the worker confirms the writes (SQS
+    redelivers on failure and parks the message in the DLQ after retries).
+    Only a durable queue (SQS) is used; the in-process stand-in would lose
+    the report when the container goes away, so the writes happen inline,
+    as they do when the handoff itself fails.
+    """
+    if write_behind and queue is not None and not queue.durable:
+        print("Warning: WRITE_BEHIND needs JOB_QUEUE_URL (SQS); writing inline")
+    elif write_behind and queue is not None:
+        try:
+            queue.enqueue(persist_message(key, report))
+            print(json.dumps({'event': 'persist_queued', 'report_id': report.get('report_id')}))
+            return None
+        except Exception as e:
+            print(f"Error: write-behind handoff failed, writing inline: {str(e)}")
+
+    latencies = _persist(table, s3, bucket, key, report)
+    print(json.dumps({'event': 'persist', 'report_id': report.get('report_id'), **latencies}))
+    return latencies
+
+
+def persist_job(table, s3, bucket, job):
+    """Worker side of write-behind; raises so the message is redelivered on failure"""
+    latencies = _persist(table, s3, bucket, job['key'], job['report'])
+    print(json.dumps({'event': 'persist', 'report_id': job['report'].get('report_id'),
+                      'write_behind': True, **latencies}))
+    return latencies
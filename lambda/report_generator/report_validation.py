@@ -0,0 +1,104 @@
+import json
+
+# Required fields for each CAPA report section
+REPORT_SCHEMA = {
+    "five_whys": ["why_1", "why_2", "why_3", "why_4", "why_5"],
+    "fishbone": ["man", "machine", "material", "method", "measurement", "environment"],
+    "8d_report": [
+        "d1_team", "d2_problem", "d3_interim", "d4_root_cause",
+        "d5_corrective", "d6_implementation", "d7_prevention", "d8_recognition"
+    ],
+}
+
+_decoder = json.JSONDecoder()
+
+
+def _strip_fences(text):
+    """Remove markdown code fences the LLM sometimes wraps JSON in"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def _decode_object_at(text, start):
+    """Decode the JSON object starting at the first '{' at/after start, or None"""
+    brace = text.find("{", start)
+    if brace == -1:
+        return None
+    try:
+        obj, _ = _decoder.raw_decode(text, brace)
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def extract_sections(report_text):
+    """
+    Tolerantly extract report sections from LLM output.
+    Tries the whole document first, then salvages each section on its own
+    so one truncated or malformed section does not discard the others.
+    """
+    text = _strip_fences(report_text)
+
+    document = _decode_object_at(text, 0)
+    if document is not None:
+        return {name: document[name] for name in REPORT_SCHEMA if name in document}
+
+    sections = {}
+    for name in REPORT_SCHEMA:
+        key_pos = text.find(f'"{name}"')
+        if key_pos == -1:
+            continue
+        section = _decode_object_at(text, key_pos + len(name) + 2)
+        if section is not None:
+            sections[name] = section
+    return sections
+
+
+def extract_section(section_text, name):
+    """Extract a single regenerated section (bare or wrapped in its key)"""
+    obj = _decode_object_at(_strip_fences(section_text), 0)
+    if obj is None:
+        return None
+    if isinstance(obj.get(name), dict):
+        return obj[name]
+    return obj
+
+
+def validate_section(name, section):
+    """Return True if section has every required field as a non-empty string"""
+    if not isinstance(section, dict):
+        return False
+    for field in REPORT_SCHEMA[name]:
+        value = section.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return False
+    return True
+
+
+def split_valid_sections(sections):
+    """Split extracted sections into (valid dict, list of missing/invalid names)"""
+    valid = {}
+    invalid = []
+    for name in REPORT_SCHEMA:
+        if validate_section(name, sections.get(name)):
+            valid[name] = {field: sections[name][field] for field in REPORT_SCHEMA[name]}
+        else:
+            invalid.append(name)
+    return valid, invalid
+
+
+def build_section_prompt(failure_mode, name, context=""):
+    """Small prompt that regenerates a single report section"""
+    skeleton = json.dumps({field: "..." for field in REPORT_SCHEMA[name]}, indent=2)
+    return f"""You are a quality engineering expert writing part of a CAPA report for a {failure_mode} defect.
+{context}
+
+Generate ONLY the "{name}" section as a JSON object with exactly these fields:
+
+{skeleton}
+
+Generate realistic, detailed content for each field. Return ONLY the JSON object, no additional text."""
@@ -0,0 +1,193 @@
+"""
+Active-learning selection: pick a fixed budget of labelled feedback images
+for the next retraining run instead of retraining on everything.
+
+Candidates come from the inference data table's feedback-status-index.
+Labels are written by the feedback handler (POST /feedback on the
+inference API, lambda/feedback/handler.py): it logs each submission to
+the feedback table and sets feedback_status = "labeled" plus `label` on
+the prediction record. Unlabelled records have no feedback_status, so
+they never enter the index. Each candidate is scored by
+uncertainty (softmax margin or entropy), then a budget is chosen by
+uncertainty-weighted farthest-first traversal over the stored embeddings,
+so the selection covers feature space instead of many near-identical
+hard cases. The result is a manifest train_model.py consumes directly.
+
+    python scripts/active_learning.py --budget 200 --days 30
+    python scripts/train_model.py --manifest models/active_learning_manifest.json
+"""
+import argparse
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(REPO_ROOT, 'models', 'active_learning_manifest.json')
+STORAGE_STACK = "CapaStorageStack"
+FEEDBACK_INDEX = "feedback-status-index"
+
+LABELLED_STATUS = "labeled"
+SELECTED_STATUS = "selected"
+
+# Farthest-first runs over the most uncertain pool_factor * budget candidates
+POOL_FACTOR = 4
+
+
+def query_candidates(table, status=LABELLED_STATUS, since=None):
+    """Prediction records with the given feedback status (newer than `since`)"""
+    from boto3.dynamodb.conditions import Key
+
+    condition = Key('feedback_status').eq(status)
+    if since:
+        condition = condition & Key('inference_timestamp').gte(since)
+
+    kwargs = {'IndexName': FEEDBACK_INDEX, 'KeyConditionExpression': condition}
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get('Items', []):
+            # Only labelled records with stored softmax outputs can be scored
+            if item.get('label') and item.get('probabilities'):
+                yield item
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def uncertainty(probabilities, method='margin'):
+    """0 (confident) .. 1 (maximally uncertain)"""
+    probabilities = sorted((float(p) for p in probabilities), reverse=True)
+    if method == 'entropy':
+        entropy = -sum(p * math.log(p) for p in probabilities if p > 0)
+        return entropy / math.log(len(probabilities)) if len(probabilities) > 1 else 0.0
+    second = probabilities[1] if len(probabilities) > 1 else 0.0
+    return 1.0 - (probabilities[0] - second)
+
+
+def decode_embedding(value):
+    """float16 bytes (DynamoDB Binary) -> unit-length float32 vector, or None"""
+    if value is None:
+        return None
+    vector = np.frombuffer(bytes(getattr(value, 'value', value)), dtype=np.float16).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def select(candidates, budget, method='margin', pool_factor=POOL_FACTOR):
+    """
+    Pick up to `budget` candidates. Returns [(candidate, uncertainty, score)]
+    in selection order; score is uncertainty x cosine distance to the
+    closest already-selected embedding (1 for the first pick or when a
+    candidate has no embedding).
+    """
+    scored = sorted(((uncertainty(c['probabilities'], method), c) for c in candidates),
+                    key=lambda pair: pair[0], reverse=True)
+    pool = scored[:budget * pool_factor]
+    if not pool:
+        return []
+
+    scores = np.array([u for u, _ in pool], dtype=np.float32)
+    embeddings = [decode_embedding(c.get('embedding')) for _, c in pool]
+    dimension = next((len(e) for e in embeddings if e is not None), 0)
+    has_embedding = np.array([e is not None and len(e) == dimension for e in embeddings])
+    matrix = np.zeros((len(pool), dimension), dtype=np.float32)
+    for i, e in enumerate(embeddings):
+        if has_embedding[i]:
+            matrix[i] = e
+
+    # Cosine distance to the nearest selected point; 1 until something is selected
+    min_distance = np.ones(len(pool), dtype=np.float32)
+    available = np.ones(len(pool), dtype=bool)
+    selected = []
+    for _ in range(min(budget, len(pool))):
+        weighted = np.where(available, scores * min_distance, -1.0)
+        pick = int(np.argmax(weighted))
+        selected.append((pool[pick][1], float(scores[pick]), float(weighted[pick])))
+        available[pick] = False
+        if has_embedding[pick]:
+            distance = np.clip(1.0 - matrix @ matrix[pick], 0.0, 2.0)
+            min_distance = np.where(has_embedding, np.minimum(min_distance, distance), min_distance)
+    return selected
+
+
+def build_manifest(selected, bucket, args_summary):
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        **args_summary,
+        'bucket': bucket,
+        'images': [
+            {
+                'image_id': c['image_id'],
+                'inference_timestamp': c['inference_timestamp'],
+                'label': c['label'],
+                'predicted_class': c.get('predicted_class'),
+                'image_key': c.get('image_key'),
+                'uncertainty': round(u, 4),
+                'score': round(score, 4)
+            }
+            for c, u, score in selected
+        ]
+    }
+
+
+def mark_selected(table, selected):
+    """Move selected records out of the candidate partition so they are not re-picked"""
+    for candidate, _, _ in selected:
+        table.update_item(
+            Key={'image_id': candidate['image_id'], 'inference_timestamp': candidate['inference_timestamp']},
+            UpdateExpression="SET feedback_status = :s",
+            ExpressionAttributeValues={':s': SELECTED_STATUS}
+        )
+
+
+def resolve_names(table=None, bucket=None, stack_name=STORAGE_STACK):
+    if table and bucket:
+        return table, bucket
+    import boto3
+    stack = boto3.client('cloudformation').describe_stacks(StackName=stack_name)['Stacks'][0]
+    outputs = {o['OutputKey']: o['OutputValue'] for o in stack.get('Outputs', [])}
+    try:
+        return table or outputs['InferenceDataTableName'], bucket or outputs['ImagesBucketName']
+    except KeyError as e:
+        raise RuntimeError(f"{stack_name} has no output {e}; pass --table/--bucket") from None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select informative feedback images for retraining")
+    parser.add_argument('--budget', type=int, default=200, help='Images to select')
+    parser.add_argument('--days', type=int, default=30, help='Only feedback on predictions this recent')
+    parser.add_argument('--method', choices=['margin', 'entropy'], default='margin')
+    parser.add_argument('--status', default=LABELLED_STATUS, help='feedback_status to select from')
+    parser.add_argument('--table', help='Inference data table (default: CapaStorageStack output)')
+    parser.add_argument('--bucket', help='Images bucket (default: CapaStorageStack output)')
+    parser.add_argument('--output', default=MANIFEST_PATH)
+    parser.add_argument('--mark-selected', action='store_true',
+                        help=f"Set feedback_status to '{SELECTED_STATUS}' on the selected records")
+    args = parser.parse_args()
+
+    import boto3
+    table_name, bucket = resolve_names(args.table, args.bucket)
+    table = boto3.resource('dynamodb').Table(table_name)
+
+    since = (datetime.now(timezone.utc) - timedelta(days=args.days)).isoformat()
+    candidates = list(query_candidates(table, args.status, since))
+    selected = select(candidates, args.budget, args.method)
+
+    manifest = build_manifest(selected, bucket, {
+        'budget': args.budget, 'method': args.method, 'status': args.status,
+        'since': since, 'candidates': len(candidates)
+    })
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if args.mark_selected:
+        mark_selected(table, selected)
+
+    print(f"✅ Selected {len(selected)} of {len(candidates)} candidates -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
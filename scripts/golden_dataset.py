@@ -0,0 +1,177 @@
+"""
+Upload labelled images to the golden (retraining) dataset, skipping
+near-duplicates of images already stored.
+
+The bucket keeps images at images/<class>/<name>_<digest><ext> (the
+digest keeps same-named frames from different folders apart) and a hash
+index of everything stored at index/image_hashes.json.gz; an upload is
+skipped when an image of the same class is within the duplicate distance.
+
+    # Folder per class, like the training data
+    python scripts/golden_dataset.py upload "data/NEU Metal Surface Defects Data/train"
+
+    # Rebuild the index from the bucket contents
+    python scripts/golden_dataset.py rebuild-index
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'inference'))
+
+from phash import DEFAULT_DISTANCE, HashIndex, image_hash  # noqa: E402
+
+STORAGE_STACK = "CapaStorageStack"
+IMAGES_PREFIX = "images/"
+INDEX_KEY = "index/image_hashes.json.gz"
+IMAGE_EXTENSIONS = ('.bmp', '.jpg', '.jpeg', '.png')
+DIGEST_CHARS = 12
+
+
+def image_key(label, filename, body):
+    """Camera frame names repeat across folders, so a content digest goes in the key"""
+    stem, extension = os.path.splitext(filename)
+    digest = hashlib.sha256(body).hexdigest()[:DIGEST_CHARS]
+    return f"{IMAGES_PREFIX}{label}/{stem}_{digest}{extension}"
+
+
+def key_label(key):
+    return key[len(IMAGES_PREFIX):].split('/', 1)[0]
+
+
+def load_index(s3, bucket, max_distance=DEFAULT_DISTANCE):
+    try:
+        body = s3.get_object(Bucket=bucket, Key=INDEX_KEY)['Body'].read()
+    except s3.exceptions.NoSuchKey:
+        return HashIndex(max_distance)
+    return HashIndex.loads(body, max_distance)
+
+
+def save_index(s3, bucket, index):
+    buffer = io.BytesIO()
+    index.save(buffer)
+    s3.put_object(Bucket=bucket, Key=INDEX_KEY, Body=buffer.getvalue(),
+                  ContentType='application/json', ContentEncoding='gzip')
+
+
+def find_duplicate(index, label, value):
+    """Stored key of a same-class near-duplicate, or None"""
+    for key, _ in index.within(value):
+        if key_label(key) == label:
+            return key
+    return None
+
+
+def iter_labelled_images(root):
+    """(label, path) for every image under root/<label>/"""
+    for label in sorted(os.listdir(root)):
+        class_dir = os.path.join(root, label)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield label, os.path.join(class_dir, filename)
+
+
+def upload_images(s3, bucket, images, max_distance=DEFAULT_DISTANCE):
+    """Upload (label, path) pairs that are not near-duplicates; returns stats"""
+    index = load_index(s3, bucket, max_distance)
+    stats = {'indexed': len(index), 'uploaded': 0, 'skipped_duplicate': 0, 'failed': 0}
+    start = time.perf_counter()
+
+    try:
+        for label, path in images:
+            try:
+                with open(path, 'rb') as f:
+                    body = f.read()
+                value = image_hash(io.BytesIO(body))
+            except OSError as e:
+                print(f"✗ {path}: {str(e)}")
+                stats['failed'] += 1
+                continue
+
+            duplicate = find_duplicate(index, label, value)
+            if duplicate is not None:
+                stats['skipped_duplicate'] += 1
+                continue
+
+            key = image_key(label, os.path.basename(path), body)
+            s3.put_object(Bucket=bucket, Key=key, Body=body)
+            index.add(key, value)
+            stats['uploaded'] += 1
+    finally:
+        # Keep the index in step with whatever made it into the bucket
+        if stats['uploaded']:
+            save_index(s3, bucket, index)
+
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def rebuild_index(s3, bucket, max_distance=DEFAULT_DISTANCE):
+    """Hash every stored image (e.g. after manual uploads) and save the index"""
+    index = HashIndex(max_distance)
+    kwargs = {'Bucket': bucket, 'Prefix': IMAGES_PREFIX}
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            body = s3.get_object(Bucket=bucket, Key=obj['Key'])['Body'].read()
+            index.add(obj['Key'], image_hash(io.BytesIO(body)))
+        if not response.get('IsTruncated'):
+            break
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+    save_index(s3, bucket, index)
+    return index
+
+
+def resolve_golden_bucket(bucket=None, stack_name=STORAGE_STACK):
+    if bucket:
+        return bucket
+    import boto3
+    stack = boto3.client('cloudformation').describe_stacks(StackName=stack_name)['Stacks'][0]
+    outputs = {o['OutputKey']: o['OutputValue'] for o in stack.get('Outputs', [])}
+    if 'GoldenDatasetBucketName' not in outputs:
+        raise RuntimeError(f"{stack_name} has no GoldenDatasetBucketName output; pass --bucket")
+    return outputs['GoldenDatasetBucketName']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicated golden dataset uploads")
+    parser.add_argument('command', choices=['upload', 'rebuild-index'])
+    parser.add_argument('roots', nargs='*', help='Folders with one subfolder per class')
+    parser.add_argument('--bucket', help='Golden dataset bucket (default: CapaStorageStack output)')
+    parser.add_argument('--distance', type=int, default=DEFAULT_DISTANCE,
+                        help='Hash distance treated as a duplicate')
+    parser.add_argument('--local', action='store_true', help='Upload into an in-process stand-in')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Run the upload N times (re-runs should skip everything)')
+    args = parser.parse_args()
+
+    if args.local:
+        sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+        from local_aws import GOLDEN_BUCKET, FakeS3
+        s3, bucket = FakeS3(), GOLDEN_BUCKET
+    else:
+        import boto3
+        s3, bucket = boto3.client('s3'), resolve_golden_bucket(args.bucket)
+
+    if args.command == 'rebuild-index':
+        index = rebuild_index(s3, bucket, args.distance)
+        print(f"✅ Indexed {len(index)} images in s3://{bucket}/{INDEX_KEY}")
+        return
+
+    if not args.roots:
+        parser.error("upload needs at least one folder")
+    for run in range(args.repeat):
+        for root in args.roots:
+            stats = upload_images(s3, bucket, iter_labelled_images(root), args.distance)
+            print(json.dumps({'run': run + 1, 'root': root, **stats}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Query prediction rollups and flag drift against the valid-split baseline.
+
+Answers "last 24 h class mix and p10 confidence" from hourly rollup items
+(one key read per hour, no table scan).
+
+    # Build the baseline from the valid split (after training)
+    python scripts/prediction_drift.py baseline
+
+    # Last 24 h, plant-wide, p10 confidence, drift vs baseline
+    python scripts/prediction_drift.py query --hours 24 --quantile 0.1
+"""
+import argparse
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'inference'))
+
+from prediction_stats import (  # noqa: E402
+    ALL_LINES, HIST_BINS, hist_bin, merge, psi, quantile, read_window, sketch_bin
+)
+
+DATA_DIR = os.path.join(REPO_ROOT, 'data', 'NEU Metal Surface Defects Data')
+MODELS_DIR = os.path.join(REPO_ROOT, 'models')
+BASELINE_PATH = os.path.join(MODELS_DIR, 'baseline_stats.json')
+STORAGE_STACK = "CapaStorageStack"
+
+# Population stability index above this is treated as drift
+PSI_THRESHOLD = 0.2
+
+
+def build_baseline(data_dir=DATA_DIR, models_dir=MODELS_DIR, output=BASELINE_PATH):
+    """Run the trained model over the valid split and store its prediction mix"""
+    import torch
+    from torchvision import datasets, transforms
+    from torchvision.models import resnet18
+
+    with open(os.path.join(models_dir, 'model_metadata.json'), 'r') as f:
+        metadata = json.load(f)
+    class_names = metadata['class_names']
+
+    model = resnet18(num_classes=len(class_names))
+    model.load_state_dict(torch.load(os.path.join(models_dir, 'resnet18_capa.pth'), map_location='cpu'))
+    model.eval()
+
+    # Same preprocessing as the inference handler
+    transform = transforms.Compose([
+        transforms.Resize(tuple(metadata['input_size'])),
+        transforms.ToTensor(),
+        transforms.Normalize(metadata['normalization']['mean'], metadata['normalization']['std'])
+    ])
+    loader = torch.utils.data.DataLoader(
+        datasets.ImageFolder(os.path.join(data_dir, 'valid'), transform=transform), batch_size=32
+    )
+
+    baseline = {'n': 0, 'classes': {}, 'hist': [0] * HIST_BINS, 'sketch': {}}
+    with torch.no_grad():
+        for inputs, _ in loader:
+            confidences, predicted = torch.max(torch.nn.functional.softmax(model(inputs), dim=1), 1)
+            for confidence, index in zip(confidences.tolist(), predicted.tolist()):
+                name = class_names[index]
+                baseline['n'] += 1
+                baseline['classes'][name] = baseline['classes'].get(name, 0) + 1
+                baseline['hist'][hist_bin(confidence)] += 1
+                bin_index = sketch_bin(confidence)
+                baseline['sketch'][bin_index] = baseline['sketch'].get(bin_index, 0) + 1
+
+    baseline['model_version'] = metadata.get('model_version', 'unknown')
+    with open(output, 'w') as f:
+        json.dump(baseline, f, indent=2)
+    print(f"✅ Baseline from {baseline['n']} valid images saved to: {output}")
+    return baseline
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        baseline = json.load(f)
+    baseline['sketch'] = {int(k): v for k, v in baseline['sketch'].items()}
+    return baseline
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+
+def summarize(total, q=0.1, baseline=None):
+    """Class mix, confidence quantile, histogram, throughput and drift"""
+    n = total['n']
+    summary = {
+        'predictions': n,
+        'class_mix': {c: round(count / n, 4) for c, count in sorted(total['classes'].items())} if n else {},
+        f"p{int(q * 100)}_confidence": _round(quantile(total['sketch'], q)),
+        'mean_confidence': round(total['conf_sum'] / n, 4) if n else None,
+        'confidence_histogram': total['hist'],
+        'per_hour': dict(sorted(total['per_hour'].items()))
+    }
+
+    if baseline and n:
+        class_psi = psi(baseline['classes'], total['classes'])
+        confidence_psi = psi(baseline['hist'], total['hist'])
+        summary['drift'] = {
+            'class_mix_psi': round(class_psi, 4),
+            'confidence_psi': round(confidence_psi, 4),
+            f"baseline_p{int(q * 100)}_confidence": _round(quantile(baseline['sketch'], q)),
+            'threshold': PSI_THRESHOLD,
+            'drifted': class_psi > PSI_THRESHOLD or confidence_psi > PSI_THRESHOLD
+        }
+    return summary
+
+
+def resolve_stats_table(table=None, stack_name=STORAGE_STACK):
+    if table:
+        return table
+    import boto3
+    stack = boto3.client('cloudformation').describe_stacks(StackName=stack_name)['Stacks'][0]
+    outputs = {o['OutputKey']: o['OutputValue'] for o in stack.get('Outputs', [])}
+    if 'StatsTableName' not in outputs:
+        raise RuntimeError(f"{stack_name} has no StatsTableName output; pass --table")
+    return outputs['StatsTableName']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prediction rollup queries and drift checks")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    query = sub.add_parser('query', help='Aggregate the last N hours')
+    query.add_argument('--hours', type=int, default=24)
+    query.add_argument('--line', default=ALL_LINES, help='Production line (default: plant-wide)')
+    query.add_argument('--quantile', type=float, default=0.1)
+    query.add_argument('--table', help='Stats table (default: CapaStorageStack output)')
+    query.add_argument('--baseline', default=BASELINE_PATH)
+
+    base = sub.add_parser('baseline', help='Build the valid-split baseline')
+    base.add_argument('--data-dir', default=DATA_DIR)
+    base.add_argument('--models-dir', default=MODELS_DIR)
+    base.add_argument('--output', default=BASELINE_PATH)
+
+    args = parser.parse_args()
+    if args.command == 'baseline':
+        build_baseline(args.data_dir, args.models_dir, args.output)
+        return
+
+    import boto3
+    table_name = resolve_stats_table(args.table)
+    items = read_window(boto3.resource('dynamodb'), table_name, args.hours, args.line)
+    print(json.dumps(summarize(merge(items), args.quantile, load_baseline(args.baseline)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
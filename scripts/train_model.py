@@ -3,14 +3,78 @@ import torch.nn as nn
 import torch.optim as optim
 from torchvision import datasets, transforms, models
 from torch.utils.data import DataLoader
+import argparse
 import json
 import os
+import sys
+from datetime import datetime, timezone
 from pathlib import Path
 
-def train_resnet18(data_dir, output_dir, epochs=10):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda', 'inference'))
+
+from phash import DEFAULT_DISTANCE, HashIndex, image_hash
+
+def dedupe_samples(samples, max_distance=DEFAULT_DISTANCE, reference=None):
+    """
+    Drop near-duplicate images from an ImageFolder sample list.
+    Only images with the same label count as duplicates; anything close to
+    an image in `reference` (per-class indexes, e.g. the valid split) is dropped too.
+    Returns (kept samples, per-class indexes, number dropped by reference).
+    """
+    indexes = {}
+    kept = []
+    overlap = 0
+    for path, target in samples:
+        value = image_hash(path)
+        if reference and target in reference and reference[target].nearest(value):
+            overlap += 1
+            continue
+        index = indexes.setdefault(target, HashIndex(max_distance))
+        if index.add_if_new(path, value) is None:
+            kept.append((path, target))
+    return kept, indexes, overlap
+
+def set_samples(dataset, samples):
+    dataset.samples = dataset.imgs = samples
+    dataset.targets = [target for _, target in samples]
+
+def load_manifest_samples(manifest_path, class_to_idx, cache_dir):
+    """
+    (path, target) samples for the images an active-learning manifest selected.
+    Images stored in S3 are downloaded once into cache_dir/<label>/.
+    """
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+
+    s3 = None
+    samples = []
+    for entry in manifest['images']:
+        label = entry['label']
+        if label not in class_to_idx:
+            print(f"⚠️  Skipping {entry['image_id']}: unknown label {label}")
+            continue
+
+        path = entry.get('path')
+        if not path:
+            if not entry.get('image_key'):
+                print(f"⚠️  Skipping {entry['image_id']}: no stored image")
+                continue
+            path = os.path.join(cache_dir, label, os.path.basename(entry['image_key']))
+            if not os.path.exists(path):
+                if s3 is None:
+                    import boto3
+                    s3 = boto3.client('s3')
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                s3.download_file(manifest['bucket'], entry['image_key'], path)
+        samples.append((path, class_to_idx[label]))
+    return samples
+
+def train_resnet18(data_dir, output_dir, epochs=10, dedupe_distance=DEFAULT_DISTANCE, manifest=None):
     """
     Train ResNet-18 on NEU Metal Surface Defects Dataset
     Classes are automatically derived from folder structure
+    Near-duplicate frames are removed first (dedupe_distance=0 disables)
+    manifest: active-learning manifest whose images are added to the train split
     """
     
     # Define transforms
@@ -46,6 +110,24 @@ def train_resnet18(data_dir, output_dir, epochs=10):
     
     print(f"📊 Detected {num_classes} classes: {class_names}")
     
+    # Feedback images picked by scripts/active_learning.py (a fixed budget)
+    if manifest:
+        selected = load_manifest_samples(
+            manifest, train_dataset.class_to_idx, os.path.join(output_dir, 'manifest_images')
+        )
+        set_samples(train_dataset, train_dataset.samples + selected)
+        print(f"🎯 Added {len(selected)} feedback images from {manifest}")
+    
+    # Drop re-captured frames; train images matching a valid image would leak
+    if dedupe_distance > 0:
+        val_samples, val_indexes, _ = dedupe_samples(val_dataset.samples, dedupe_distance)
+        train_samples, _, overlap = dedupe_samples(train_dataset.samples, dedupe_distance, val_indexes)
+        print(f"🧹 Removed {len(val_dataset.samples) - len(val_samples)} near-duplicates from valid, "
+              f"{len(train_dataset.samples) - len(train_samples) - overlap} from train "
+              f"(+{overlap} train images matching valid)")
+        set_samples(val_dataset, val_samples)
+        set_samples(train_dataset, train_samples)
+    
     # Create data loaders
     train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True, num_workers=4)
     val_loader = DataLoader(val_dataset, batch_size=32, shuffle=False, num_workers=4)
@@ -103,9 +185,12 @@ def train_resnet18(data_dir, output_dir, epochs=10):
     
     # Save metadata (class names and model config)
     metadata = {
+        'model_version': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
         'class_names': class_names,
         'num_classes': num_classes,
         'model_architecture': 'resnet18',
+        'train_images': len(train_dataset.samples),
+        'manifest': manifest,
         'input_size': [224, 224],
         'normalization': {
             'mean': [0.485, 0.456, 0.406],
@@ -127,5 +212,10 @@ if __name__ == "__main__":
     DATA_DIR = "./data/NEU Metal Surface Defects Data"  # ← Correct path
     OUTPUT_DIR = "./models"
     
+    parser = argparse.ArgumentParser(description="Train the CAPA defect classifier")
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--manifest', help='Active-learning manifest (scripts/active_learning.py)')
+    args = parser.parse_args()
+    
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    train_resnet18(DATA_DIR, OUTPUT_DIR, epochs=10)
+    train_resnet18(DATA_DIR, OUTPUT_DIR, epochs=args.epochs, manifest=args.manifest)
@@ -0,0 +1,287 @@
+"""
+Bulk importer for historical CAPA reports (QMS exports).
+
+Streams records from JSON / JSONL / CSV, writes DynamoDB through
+batch_writer and uploads to S3 with a concurrent pool. Every record
+carries a content_hash, so re-running an import skips unchanged reports.
+
+    python seed_data/bulk_import.py export.jsonl
+    python seed_data/bulk_import.py export.csv --table T --bucket B
+    python seed_data/bulk_import.py export.json --local   # in-process stand-ins
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda', 'report_generator'))
+
+from archive import encode_report, report_key  # noqa: E402
+from persistence import to_dynamo  # noqa: E402
+
+STORAGE_STACK = "CapaStorageStack"
+BATCH_GET_SIZE = 100  # DynamoDB BatchGetItem limit
+CHUNK_SIZE = 500
+S3_WORKERS = 16
+MAX_RETRIES = 5
+
+# Fields that don't change what a report says
+BOOKKEEPING_FIELDS = {'content_hash', 'imported_at'}
+
+
+# ---------- Readers ----------
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    """Stream objects out of a top-level JSON array without json.load"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("Expected a top-level JSON array")
+    buffer = buffer[1:]
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+def _unflatten(row):
+    """CSV columns like 'five_whys.why_1' become nested dicts"""
+    record = {}
+    for column, value in row.items():
+        if value in (None, ''):
+            continue
+        target = record
+        parts = column.split('.')
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return record
+
+
+def read_records(path):
+    """Yield raw records from a .json, .jsonl/.ndjson or .csv export"""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if extension in ('.jsonl', '.ndjson'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif extension == '.csv':
+            for row in csv.DictReader(f):
+                yield _unflatten(row)
+        elif extension == '.json':
+            yield from _iter_json_array(f)
+        else:
+            raise ValueError(f"Unsupported export format: {extension}")
+
+
+# ---------- Normalization ----------
+
+def content_hash(record):
+    content = {k: v for k, v in record.items() if k not in BOOKKEEPING_FIELDS}
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def normalize(record, is_seed=False):
+    """Fill the fields the reports table and S3 layout require"""
+    # created_at is part of the primary key, so it must come from the export
+    for field in ('failure_mode', 'created_at'):
+        if field not in record:
+            raise ValueError(f"Record missing {field}: {str(record)[:120]}")
+
+    report = dict(record)
+    report.setdefault('report_id', f"QMS_{content_hash(record)[:16]}")
+    report.setdefault('image_id', 'historical')
+    report.setdefault('is_seed', is_seed)
+    if isinstance(report['is_seed'], str):
+        report['is_seed'] = report['is_seed'].lower() == 'true'
+    # Sparse key for the seed-failure-mode-index GSI the report generator queries
+    if report['is_seed']:
+        report['seed_failure_mode'] = report['failure_mode']
+    report['content_hash'] = content_hash(report)
+    return report
+
+
+# ---------- Writers ----------
+
+def _with_retries(func, *args):
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            return func(*args)
+        except Exception:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(0.1 * (2 ** attempt))
+
+
+def existing_hashes(dynamodb, table_name, reports):
+    """content_hash of reports already in the table, keyed by primary key"""
+    hashes = {}
+    # BatchGetItem rejects duplicate keys within a request
+    unique = {(r['report_id'], r['created_at']) for r in reports}
+    keys = [{'report_id': report_id, 'created_at': created_at} for report_id, created_at in unique]
+
+    for i in range(0, len(keys), BATCH_GET_SIZE):
+        request = {table_name: {
+            'Keys': keys[i:i + BATCH_GET_SIZE],
+            'ProjectionExpression': 'report_id, created_at, content_hash'
+        }}
+        while request:
+            response = _with_retries(lambda: dynamodb.batch_get_item(RequestItems=request))
+            for item in response.get('Responses', {}).get(table_name, []):
+                hashes[(item['report_id'], item['created_at'])] = item.get('content_hash')
+            # Retry keys DynamoDB did not get to
+            request = response.get('UnprocessedKeys') or None
+
+    return hashes
+
+
+def write_table(table, reports):
+    """batch_writer resends UnprocessedItems; throttling retries the chunk"""
+    def flush():
+        with table.batch_writer(overwrite_by_pkeys=['report_id', 'created_at']) as batch:
+            for report in reports:
+                batch.put_item(Item=to_dynamo(report))
+    _with_retries(flush)
+
+
+def upload_objects(s3, bucket, reports, executor):
+    def upload(report):
+        _with_retries(lambda: s3.put_object(
+            Bucket=bucket, Key=report_key(report), Body=encode_report(report),
+            ContentType='application/json', ContentEncoding='gzip'
+        ))
+    return list(executor.map(upload, reports))
+
+
+def import_records(records, dynamodb, s3, table_name, bucket, is_seed=False,
+                   chunk_size=CHUNK_SIZE, s3_workers=S3_WORKERS):
+    """
+    Import an iterable of records in chunks. Returns stats including
+    written/skipped/failed counts and records per second.
+    """
+    table = dynamodb.Table(table_name)
+    stats = {'read': 0, 'written': 0, 'skipped': 0, 'failed': 0}
+    start = time.perf_counter()
+    records = iter(records)
+
+    with ThreadPoolExecutor(max_workers=s3_workers) as executor:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            stats['read'] += len(chunk)
+
+            reports = []
+            for record in chunk:
+                try:
+                    reports.append(normalize(record, is_seed))
+                except ValueError as e:
+                    print(f"✗ {e}")
+                    stats['failed'] += 1
+
+            # Idempotency: skip reports whose stored hash already matches
+            stored = existing_hashes(dynamodb, table_name, reports)
+            changed = [
+                r for r in reports
+                if stored.get((r['report_id'], r['created_at'])) != r['content_hash']
+            ]
+            stats['skipped'] += len(reports) - len(changed)
+            if not changed:
+                continue
+
+            try:
+                imported_at = datetime.now().isoformat()
+                for report in changed:
+                    report['imported_at'] = imported_at
+                # S3 first so a table hit always has its object behind it
+                upload_objects(s3, bucket, changed, executor)
+                write_table(table, changed)
+                stats['written'] += len(changed)
+            except Exception as e:
+                print(f"✗ Chunk failed: {str(e)}")
+                stats['failed'] += len(changed)
+
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    stats['records_per_second'] = round(stats['read'] / stats['seconds'], 1) if stats['seconds'] else None
+    return stats
+
+
+# ---------- Resource resolution ----------
+
+def resolve_storage_names(table=None, bucket=None, stack_name=STORAGE_STACK):
+    """CLI arguments win; otherwise read the storage stack's outputs"""
+    if table and bucket:
+        return table, bucket
+
+    import boto3
+    stack = boto3.client('cloudformation').describe_stacks(StackName=stack_name)['Stacks'][0]
+    outputs = {o['OutputKey']: o['OutputValue'] for o in stack.get('Outputs', [])}
+    try:
+        return table or outputs['ReportsTableName'], bucket or outputs['ReportsBucketName']
+    except KeyError as e:
+        raise RuntimeError(f"{stack_name} has no output {e}; pass --table/--bucket") from None
+
+
+def local_resources():
+    """In-process DynamoDB/S3 stand-ins from benchmarks/local_aws.py"""
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+    from local_aws import REPORTS_BUCKET, REPORTS_TABLE, FakeDynamoResource, FakeS3
+
+    dynamodb = FakeDynamoResource()
+    dynamodb.create_table(REPORTS_TABLE, 'report_id', 'created_at')
+    return dynamodb, FakeS3(), REPORTS_TABLE, REPORTS_BUCKET
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import historical CAPA reports")
+    parser.add_argument('paths', nargs='+', help='.json, .jsonl or .csv exports')
+    parser.add_argument('--table', help='Reports table (default: CapaStorageStack output)')
+    parser.add_argument('--bucket', help='Reports bucket (default: CapaStorageStack output)')
+    parser.add_argument('--stack-name', default=STORAGE_STACK)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--s3-workers', type=int, default=S3_WORKERS)
+    parser.add_argument('--seed', action='store_true', help='Mark records as RAG seed reports')
+    parser.add_argument('--local', action='store_true', help='Import into in-process stand-ins')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Run the import N times (re-runs should skip everything)')
+    args = parser.parse_args()
+
+    if args.local:
+        dynamodb, s3, table_name, bucket = local_resources()
+    else:
+        import boto3
+        dynamodb, s3 = boto3.resource('dynamodb'), boto3.client('s3')
+        table_name, bucket = resolve_storage_names(args.table, args.bucket, args.stack_name)
+
+    for run in range(args.repeat):
+        for path in args.paths:
+            stats = import_records(read_records(path), dynamodb, s3, table_name, bucket,
+                                   is_seed=args.seed, chunk_size=args.chunk_size,
+                                   s3_workers=args.s3_workers)
+            print(json.dumps({'run': run + 1, 'path': path, **stats}))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,11 @@
-import json
 import boto3
-from datetime import datetime
 from decimal import Decimal
 
-from decimal import Decimal
+from bulk_import import import_records, resolve_storage_names
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
+# Fixed keys: the same seed is the same item whenever the upload runs, so
+# re-runs skip unchanged seeds instead of adding a dated copy
+SEED_CREATED_AT = "2024-01-01T00:00:00"
 
 SEED_REPORTS = {
     "Crazing": {
@@ -183,39 +179,32 @@ SEED_REPORTS = {
 }
 
 
-def upload_seed_reports():
-    """Upload synthetic reports to DynamoDB and S3"""
+def upload_seed_reports(table=None, bucket=None):
+    """Upload synthetic reports to DynamoDB and S3 via the bulk importer"""
     dynamodb = boto3.resource('dynamodb')
     s3 = boto3.client('s3')
+    table_name, bucket = resolve_storage_names(table, bucket)
     
-    table = dynamodb.Table('CapaStorageStack-ReportsTable282F2283-8FX9IECXXFMR')
-    bucket = 'capastoragestack-reportsbucket4e7c5994-rxmlfbl4bfzb'
-    
-    for failure_mode, report_data in SEED_REPORTS.items():
-        report_id = f"SEED_{failure_mode}_{datetime.now().strftime('%Y%m%d')}"
-        
-        # Add metadata
-        full_report = {
-            "report_id": report_id,
-            "created_at": datetime.now().isoformat(),
+    records = [
+        {
+            "report_id": f"SEED_{failure_mode}",
+            "created_at": SEED_CREATED_AT,
             "image_id": f"synthetic_{failure_mode.lower()}",
             "confidence": Decimal("1.0"),
-            "is_seed": True,
             **report_data
         }
-        
-        # DynamoDB
-        table.put_item(Item=full_report)
-        
-        # S3
-        s3.put_object(
-            Bucket=bucket,
-            Key=f"reports/{report_id}.json",
-            Body=json.dumps(full_report, indent=2, cls=DecimalEncoder)
-        )
-        
-        print(f"✓ Uploaded {report_id}")
+        for failure_mode, report_data in SEED_REPORTS.items()
+    ]
+    
+    stats = import_records(records, dynamodb, s3, table_name, bucket, is_seed=True)
+    print(f"✓ Uploaded {stats['written']} seed reports ({stats['skipped']} unchanged)")
 
 
 if __name__ == "__main__":
-    upload_seed_reports()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Upload synthetic seed CAPA reports")
+    parser.add_argument('--table', help='Reports table (default: CapaStorageStack output)')
+    parser.add_argument('--bucket', help='Reports bucket (default: CapaStorageStack output)')
+    args = parser.parse_args()
+    upload_seed_reports(args.table, args.bucket)